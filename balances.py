@@ -0,0 +1,125 @@
+# Zmaterializowane sumy dni roboczych urlopów per użytkownik/rok (tabela leave_balances)
+# Uruchomienie z linii poleceń: python balances.py rebuild | check
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import Leave, LeaveBalance
+import partitions
+import workdays
+
+
+def _year_counts(date_from: date, date_to: date):
+    # {rok: dni robocze} dla zakresu urlopu
+    counts = {}
+    for year in range(date_from.year, date_to.year + 1):
+        days = workdays.get_calendar(year).count(date_from, date_to)
+        if days:
+            counts[year] = days
+    return counts
+
+
+def _upsert_statement(db: Session):
+    # INSERT ... ON CONFLICT DO UPDATE working_days = working_days + delta - jedno atomowe polecenie,
+    # równoległe zapisy tego samego (user_id, rok) nie gubią zmian i nie łamią klucza głównego
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(LeaveBalance)
+    return statement.on_conflict_do_update(
+        index_elements=[LeaveBalance.user_id, LeaveBalance.year],
+        set_={"working_days": LeaveBalance.working_days + statement.excluded.working_days},
+    )
+
+
+def apply_leave_deltas(db: Session, leaves):
+    # leaves: (user_id, date_from, date_to, sign); zmiany sumowane per (user_id, rok), jedno executemany;
+    # commit robi wywołujący, w tej samej transakcji co urlopy
+    deltas = defaultdict(int)
+    for user_id, date_from, date_to, sign in leaves:
+        for year, days in _year_counts(date_from, date_to).items():
+            deltas[(user_id, year)] += sign * days
+    rows = [
+        {"user_id": user_id, "year": year, "working_days": days}
+        for (user_id, year), days in deltas.items() if days
+    ]
+    if rows:
+        db.execute(_upsert_statement(db), rows)
+
+
+def apply_leave_delta(db: Session, user_id: int, date_from: date, date_to: date, sign: int = 1):
+    # dodaje (sign=1) lub odejmuje (sign=-1) dni urlopu
+    apply_leave_deltas(db, [(user_id, date_from, date_to, sign)])
+
+
+def compute_balances(db: Session):
+    # pełne przeliczenie {(user_id, rok): dni} ze wszystkich urlopów; lata w archiwum pominięte -
+    # ich urlopów nie ma już w leaves, saldo zostaje takie, jak w chwili archiwizacji
+    archived = partitions.archived_years(db)
+    totals = defaultdict(int)
+    for user_id, date_from, date_to in db.query(Leave.user_id, Leave.date_from, Leave.date_to).yield_per(10000):
+        for year, days in _year_counts(date_from, date_to).items():
+            if year not in archived:
+                totals[(user_id, year)] += days
+    return totals
+
+
+def rebuild_balances(db: Session):
+    totals = compute_balances(db)
+    db.query(LeaveBalance).filter(LeaveBalance.year.notin_(partitions.archived_years(db))).delete()
+    db.add_all(
+        LeaveBalance(user_id=user_id, year=year, working_days=days)
+        for (user_id, year), days in totals.items()
+    )
+    db.commit()
+    return len(totals)
+
+
+def check_balances(db: Session):
+    # lista rozbieżności (user_id, rok, w_tabeli, przeliczone) między tabelą a pełnym przeliczeniem
+    expected = compute_balances(db)
+    archived = partitions.archived_years(db)
+    stored = {(b.user_id, b.year): b.working_days for b in db.query(LeaveBalance) if b.year not in archived}
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        if stored.get(key, 0) != expected.get(key, 0):
+            mismatches.append((*key, stored.get(key, 0), expected.get(key, 0)))
+    return mismatches
+
+
+def get_year_totals(db: Session, year: int, today: date):
+    # {user_id: (dni_przeszłe, dni_przyszłe)} - suma z tabeli, podział na "dziś" liczony tylko z przyszłych urlopów
+    totals = {b.user_id: b.working_days for b in db.query(LeaveBalance).filter_by(year=year)}
+    calendar = workdays.get_calendar(year)
+
+    future = defaultdict(int)
+    if today < calendar.first_day:
+        future = totals
+    elif today < calendar.last_day:
+        upcoming = db.query(Leave.user_id, Leave.date_from, Leave.date_to).filter(
+            partitions.period_overlaps(db, today + timedelta(days=1), calendar.last_day)
+        )
+        for user_id, date_from, date_to in upcoming:
+            future[user_id] += calendar.count(max(date_from, today + timedelta(days=1)), date_to)
+
+    return {user_id: (days - future.get(user_id, 0), future.get(user_id, 0)) for user_id, days in totals.items()}
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Tabela leave_balances")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Przeliczono {rebuild_balances(db)} wierszy leave_balances")
+        else:
+            mismatches = check_balances(db)
+            for user_id, year, stored, expected in mismatches:
+                print(f"user_id={user_id} rok={year}: w tabeli {stored}, powinno być {expected}")
+            print("OK" if not mismatches else f"Rozbieżności: {len(mismatches)}")
+            raise SystemExit(1 if mismatches else 0)
+    finally:
+        db.close()
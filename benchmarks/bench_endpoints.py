@@ -0,0 +1,277 @@
+# Benchmark endpointów aplikacji (klient ASGI w procesie, bez serwera HTTP)
+# Uruchomienie z katalogu głównego:
+#   python benchmarks/bench_endpoints.py --users 200 --leaves 20000
+#   python benchmarks/bench_endpoints.py --save-baseline benchmarks/baseline.json
+#   python benchmarks/bench_endpoints.py --baseline benchmarks/baseline.json   (kod wyjścia 1 przy regresji)
+# Ruch mieszany na prawdziwym serwerze: benchmarks/locustfile.py
+# Domyślnie SQLite w katalogu tymczasowym; PostgreSQL: --database-url postgresql://.../urlopy_bench
+# (DATABASE_URL z otoczenia / .env jest ignorowany - seed kasuje wszystkie tabele)
+# Pamięć podręczna widoków jest wyłączona (CACHE_BACKEND=none), chyba że podano --cache.
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "haslo-benchmark"
+
+
+def scenarios(year: int):
+    # (nazwa, metoda, ścieżka, dane formularza); login to osobny klient bez sesji
+    return [
+        ("dashboard", "GET", f"/dashboard?year={year}", None),
+        ("calendar", "GET", "/leaves/calendar", None),
+        ("calendar_events", "GET", f"/leaves/events?start={year}-03-01&end={year}-04-12", None),
+        ("leaves_html", "GET", "/leaves/html", None),
+        ("leaves_html_filtered", "GET", f"/leaves/html?status=upcoming&date_from={year}-06-01", None),
+        ("login", "POST", "/login", {"name": "user1", "password": PASSWORD}),
+    ]
+
+
+def use_database(url: str, name: str):
+    # baza benchmarku: jawne --database-url albo plik SQLite w katalogu tymczasowym, nigdy DATABASE_URL aplikacji;
+    # ustawiane przed importem modułów aplikacji (konfiguracja czytana przy imporcie)
+    os.environ["DATABASE_URL"] = url or "sqlite:///" + os.path.join(tempfile.gettempdir(), name)
+
+
+def check_droppable(url: str):
+    # seed kasuje wszystkie tabele - tylko baza (plik SQLite) z "bench" w nazwie, jak domyślne pliki benchmarków
+    from sqlalchemy.engine import make_url
+
+    parsed = make_url(url)
+    database = parsed.database or ""
+    if parsed.get_backend_name() == "sqlite":
+        database = os.path.basename(database)
+    if "bench" not in database:
+        raise SystemExit(f"Odmowa: seed usunąłby tabele w {parsed.render_as_string(hide_password=True)} - "
+                         f"użyj bazy z 'bench' w nazwie albo domyślnego pliku SQLite")
+
+
+def seed(users: int, leaves: int, year: int, seed_value: int = 0):
+    # urlopy jednego użytkownika nie nakładają się (tak jak wymaga aplikacja); saldo przeliczane na końcu
+    from sqlalchemy import insert
+    import balances
+    import passwords
+    from database import SessionLocal, engine
+    from models import Base, Leave, User
+
+    check_droppable(str(engine.url))
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(seed_value)
+    hashed = passwords.hash_password_sync(PASSWORD)
+    db = SessionLocal()
+    db.execute(insert(User), [
+        {"email": f"user{i}@example.com", "name": f"user{i}", "password": hashed, "role": "admin" if i == 1 else "employee"}
+        for i in range(1, users + 1)
+    ])
+
+    per_user = max(leaves // users, 1)
+    rows = []
+    for user_id in range(1, users + 1):
+        day = date(year - 1, 1, 1) + timedelta(days=rnd.randint(0, 20))
+        for _ in range(per_user):
+            length = rnd.randint(0, 9)
+            rows.append({"user_id": user_id, "date_from": day, "date_to": day + timedelta(days=length), "comment": None})
+            day += timedelta(days=length + 1 + rnd.randint(0, 10))
+        if len(rows) >= 10000:
+            db.execute(insert(Leave), rows)
+            rows = []
+    if rows:
+        db.execute(insert(Leave), rows)
+    db.commit()
+    balances.rebuild_balances(db)
+    db.close()
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+
+    def pick(q):
+        return latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000
+
+    return {"p50_ms": statistics.median(latencies) * 1000, "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+async def peak_memory(request, concurrency: int) -> int:
+    # szczyt alokacji Pythona dla jednej fali równoległych żądań - osobny przebieg,
+    # bo tracemalloc wielokrotnie spowalnia kod i zafałszowałby czasy
+    tracemalloc.start()
+    try:
+        await asyncio.gather(*(request() for _ in range(concurrency)))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+async def login(client):
+    response = await client.post("/login", data={"name": "user1", "password": PASSWORD})
+    assert response.status_code in (200, 303), response.status_code
+
+
+async def measure(client_factory, name, method, path, data, requests: int, concurrency: int):
+    import httpx
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with client_factory() as client:
+        if name != "login":
+            await login(client)
+            await client.request(method, path, data=data)  # rozgrzewka (pierwsze zapytanie, szablony)
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.request(method, path, data=data)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    raise httpx.HTTPStatusError(f"{name}: {response.status_code}", request=response.request, response=response)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        peak = await peak_memory(lambda: client.request(method, path, data=data), concurrency)
+
+    return {"requests": requests, "rps": requests / elapsed, "peak_mb": peak / 2 ** 20, **percentiles(latencies)}
+
+
+async def mixed(client_factory, year: int, requests: int, concurrency: int, write_ratio: float, users: int):
+    # ruch mieszany: odczyty widoków + zapisy urlopów przez API (X-User-Id); 409 przy nakładaniu się to poprawna odpowiedź
+    rnd = random.Random(1)
+    reads = [s for s in scenarios(year) if s[0] != "login"]
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with client_factory() as client:
+        await login(client)
+
+        async def one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                if rnd.random() < write_ratio:
+                    day = date(year, 1, 1) + timedelta(days=rnd.randint(0, 360))
+                    response = await client.post("/leaves/", json={
+                        "date_from": day.isoformat(), "date_to": (day + timedelta(days=rnd.randint(0, 4))).isoformat()
+                    }, headers={"x-user-id": str(rnd.randint(1, users))})
+                    assert response.status_code in (200, 409), response.status_code
+                else:
+                    _, method, path, data = reads[i % len(reads)]
+                    response = await client.request(method, path, data=data)
+                    assert response.status_code < 400, response.status_code
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        peak = await peak_memory(lambda: client.request(*reads[0][1:3]), concurrency)
+
+    return {"requests": requests, "rps": requests / elapsed, "peak_mb": peak / 2 ** 20, **percentiles(latencies)}
+
+
+async def run(args):
+    import httpx
+    from main import app
+
+    def client_factory():
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    results = {}
+    for name, method, path, data in scenarios(args.year):
+        if args.only and name not in args.only:
+            continue
+        # bcrypt jest celowo wolny - logowań mierzymy mniej
+        requests = max(args.requests // 10, 5) if name == "login" else args.requests
+        results[name] = await measure(client_factory, name, method, path, data, requests, args.concurrency)
+    if not args.only or "mixed" in args.only:
+        results["mixed"] = await mixed(client_factory, args.year, args.requests, args.concurrency, args.write_ratio, args.users)
+    return results
+
+
+def compare(results, baseline, tolerance: float, min_delta_ms: float):
+    # regresja: p95 wolniejsze lub przepustowość niższa o więcej niż tolerance (np. 0.2 = 20%);
+    # różnice p95 poniżej min_delta_ms to szum przy bardzo szybkich endpointach
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        slower = current["p95_ms"] - previous["p95_ms"]
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance) and slower > min_delta_ms:
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance) and slower > min_delta_ms:
+            regressions.append(f"{name}: req/s {previous['rps']:.0f} -> {current['rps']:.0f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--leaves", type=int, default=20000)
+    parser.add_argument("--year", type=int, default=date.today().year)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="udział zapisów w scenariuszu mixed")
+    parser.add_argument("--only", nargs="*", help="tylko wybrane scenariusze, np. dashboard login mixed")
+    parser.add_argument("--database-url", help="baza benchmarku (nazwa z 'bench'); domyślnie plik SQLite w katalogu tymczasowym")
+    parser.add_argument("--no-seed", action="store_true", help="użyj istniejącej bazy")
+    parser.add_argument("--seed-only", action="store_true", help="tylko wypełnij bazę (np. przed locustem)")
+    parser.add_argument("--cache", action="store_true", help="z pamięcią podręczną widoków")
+    parser.add_argument("--baseline", help="plik JSON z poprzednim wynikiem do porównania")
+    parser.add_argument("--save-baseline", help="zapisz wynik jako nowy punkt odniesienia")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    # konfiguracja jest czytana przy imporcie modułów aplikacji
+    use_database(args.database_url, "urlopy_bench_endpoints.db")
+    os.environ.setdefault("OUTBOX_WORKER_ENABLED", "false")
+    os.environ.setdefault("EMAIL_BACKEND", "fake")
+    os.environ.setdefault("BCRYPT_ROUNDS", "10")
+    os.environ.setdefault("LOGIN_MAX_FAILURES", "1000000")
+    if not args.cache:
+        os.environ["CACHE_BACKEND"] = "none"
+    os.chdir(ROOT)  # szablony są ładowane ze ścieżki względnej
+
+    if not args.no_seed:
+        started = time.perf_counter()
+        seed(args.users, args.leaves, args.year)
+        print(f"baza: {os.environ['DATABASE_URL']}, seed {time.perf_counter() - started:.1f} s")
+    if args.seed_only:
+        return
+
+    results = asyncio.run(run(args))
+
+    print(f"użytkownicy: {args.users}, urlopy: {args.leaves}, współbieżność: {args.concurrency}")
+    print(f"{'scenariusz':<22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'pamięć MB':>10}")
+    for name, r in results.items():
+        print(f"{name:<22} {r['rps']:>8.0f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['peak_mb']:>10.1f}")
+
+    params = {key: getattr(args, key) for key in ("users", "leaves", "requests", "concurrency", "write_ratio", "cache")}
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"params": params, "results": results}, f, indent=2)
+        print(f"Zapisano {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != params:
+            print(f"Uwaga: inne parametry niż w {args.baseline}: {baseline.get('params')}")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print("REGRESJA", line)
+        if regressions:
+            sys.exit(1)
+        print(f"Brak regresji względem {args.baseline} (tolerancja {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Listy urlopów: obiekty ORM z leniwym leave.owner (stare leaves.html / my_leaves) a zapytania
+# o potrzebne kolumny zwracające krotki crud.LeaveRecord
+# Uruchomienie z katalogu głównego: python benchmarks/bench_list_views.py --users 1000 --leaves 100000
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def orm_all_leaves(db):
+    # dawne get_leaves bez joinedload + szablon czytający leave.owner.name (zapytanie na właściciela)
+    from models import Leave
+    leaves = db.query(Leave).all()
+    return [(leave.owner.name, leave.date_from, leave.date_to, leave.comment) for leave in leaves]
+
+
+def projection_all_leaves(db):
+    import crud
+    return [(leave.owner_name, leave.date_from, leave.date_to, leave.comment)
+            for leave in crud.get_leaves_page(db, limit=10 ** 9)]
+
+
+def orm_user_leaves(db, user_ids):
+    from models import Leave
+    return [db.query(Leave).filter_by(user_id=user_id).all() for user_id in user_ids]
+
+
+def projection_user_leaves(db, user_ids):
+    import crud
+    return [crud.get_user_leaves(db, user_id) for user_id in user_ids]
+
+
+def run(name, fn, *args):
+    from database import SessionLocal
+
+    # czas i pamięć w osobnych przebiegach - tracemalloc spowalnia kod; każda próba na świeżej sesji
+    db = SessionLocal()
+    started = time.perf_counter()
+    result = fn(db, *args)
+    elapsed = time.perf_counter() - started
+    db.close()
+
+    db = SessionLocal()
+    tracemalloc.start()
+    kept = fn(db, *args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.close()
+    del kept
+    print(f"{name:<38} {elapsed * 1000:>9.0f} ms {peak / 2 ** 20:>9.1f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--leaves", type=int, default=100000)
+    parser.add_argument("--my-leaves-users", type=int, default=200, help="ilu użytkowników otwiera 'Moje urlopy'")
+    parser.add_argument("--database-url", help="baza benchmarku (nazwa z 'bench'); domyślnie plik SQLite w katalogu tymczasowym")
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    from bench_endpoints import seed, use_database
+    use_database(args.database_url, "urlopy_bench_lists.db")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+    if not args.no_seed:
+        seed(args.users, args.leaves, date.today().year)
+
+    print(f"użytkownicy: {args.users}, urlopy: {args.leaves}")
+    print(f"{'wariant':<38} {'czas':>12} {'pamięć':>12}")
+    old = run("leaves.html - ORM + leniwy owner", orm_all_leaves)
+    new = run("leaves.html - projekcja z JOIN", projection_all_leaves)
+    assert sorted(old, key=repr) == sorted(new, key=repr)
+
+    user_ids = list(range(1, min(args.my_leaves_users, args.users) + 1))
+    run(f"my_leaves x{len(user_ids)} - ORM", orm_user_leaves, user_ids)
+    run(f"my_leaves x{len(user_ids)} - projekcja", projection_user_leaves, user_ids)
+
+
+if __name__ == "__main__":
+    main()
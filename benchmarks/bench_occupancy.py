@@ -0,0 +1,60 @@
+# Dzienne obłożenie roku: pętla dzień po dniu a tablica różnic + suma prefiksowa (occupancy.build_year)
+# Uruchomienie z katalogu głównego: python benchmarks/bench_occupancy.py --employees 10000 --leaves-per-employee 20
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from occupancy import build_year, days_in_year
+
+
+def generate(employees: int, per_employee: int, year: int, seed: int = 0):
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(employees):
+        for _ in range(per_employee):
+            date_from = date(year - 1, 12, 15) + timedelta(days=rnd.randint(0, 380))
+            rows.append((date_from, date_from + timedelta(days=rnd.randint(0, 14))))
+    return rows
+
+
+def occupancy_loop(year: int, rows):
+    first = date(year, 1, 1)
+    counts = [0] * days_in_year(year)
+    for date_from, date_to in rows:
+        day = max(date_from, first)
+        while day <= date_to and day.year == year:
+            counts[(day - first).days] += 1
+            day += timedelta(days=1)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=10000)
+    parser.add_argument("--leaves-per-employee", type=int, default=20)
+    parser.add_argument("--year", type=int, default=date.today().year)
+    args = parser.parse_args()
+
+    rows = generate(args.employees, args.leaves_per_employee, args.year)
+
+    t0 = time.perf_counter()
+    loop = occupancy_loop(args.year, rows)
+    loop_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    counts = build_year(args.year, rows)
+    build_time = time.perf_counter() - t0
+
+    assert counts.tolist() == loop
+    print(f"pracownicy: {args.employees}, urlopy: {len(rows)}, rok: {args.year}")
+    print(f"pętla dzień po dniu: {loop_time * 1000:.0f} ms")
+    print(f"tablica różnic + suma prefiksowa: {build_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
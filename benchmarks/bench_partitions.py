@@ -0,0 +1,82 @@
+# Zapytania o zakres dat przy długiej historii urlopów: warunek bez dolnej granicy date_from a z granicą
+# (partitions.lower_bound - aplikacja dodaje ją tylko w tabeli z partycjami); w PostgreSQL po
+# partitions.py migrate dodatkowo liczba czytanych partycji (EXPLAIN)
+# Uruchomienie z katalogu głównego: python benchmarks/bench_partitions.py --users 1000 --years 10
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, result
+
+
+def scanned_partitions(db, query):
+    from sqlalchemy import text
+    from sqlalchemy.dialects import postgresql
+
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    plan = "\n".join(line for (line,) in db.execute(text("EXPLAIN " + sql)))
+    return sorted({word for word in plan.replace("(", " ").split() if word.startswith("leaves_")})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=10, help="długość historii urlopów")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-url", help="baza benchmarku (nazwa z 'bench'); domyślnie plik SQLite w katalogu tymczasowym")
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    from bench_endpoints import seed, use_database
+    use_database(args.database_url, "urlopy_bench_partitions.db")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    from sqlalchemy import func, select
+    from database import SessionLocal
+    from models import Leave
+    import partitions
+
+    this_year = date.today().year
+    if not args.no_seed:
+        # seed zaczyna rok przed podanym; średnio ~10,5 dnia na urlop z przerwą
+        seed(args.users, args.users * int(args.years * 365 / 10.5), this_year - args.years + 2)
+
+    db = SessionLocal()
+    total = db.execute(select(func.count()).select_from(Leave)).scalar()
+    print(f"urlopy: {total}, lata: {this_year - args.years + 1}-{this_year}, "
+          f"baza: {db.get_bind().dialect.name}, partycje: {partitions.is_partitioned(db)}")
+
+    month_start = date(this_year, 6, 1)
+    cases = [
+        ("rok (dashboard, mapa cieplna)", date(this_year, 1, 1), date(this_year, 12, 31)),
+        ("miesiąc (kalendarz)", month_start, month_start + timedelta(days=29)),
+        ("tydzień (kto jest na urlopie)", month_start, month_start + timedelta(days=6)),
+    ]
+    print(f"{'zakres':<32} {'bez granicy':>12} {'z granicą':>12} {'wiersze':>9}")
+    for name, start, end in cases:
+        columns = select(Leave.user_id, Leave.date_from, Leave.date_to)
+        unbounded = columns.where(Leave.date_from <= end, Leave.date_to >= start)
+        bounded = unbounded.where(partitions.lower_bound(start))
+        old_ms, old_rows = timed(lambda: db.execute(unbounded).all(), args.repeat)
+        new_ms, new_rows = timed(lambda: db.execute(bounded).all(), args.repeat)
+        assert sorted(old_rows) == sorted(new_rows)
+        print(f"{name:<32} {old_ms:>9.1f} ms {new_ms:>9.1f} ms {len(new_rows):>9}")
+        if partitions.is_partitioned(db):
+            print(f"    partycje: {len(scanned_partitions(db, unbounded))} -> {', '.join(scanned_partitions(db, bounded))}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
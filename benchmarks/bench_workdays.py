@@ -0,0 +1,86 @@
+# Porównanie starej pętli dzień po dniu z silnikiem dni roboczych (workdays.py)
+# Uruchomienie z katalogu głównego: python benchmarks/bench_workdays.py --users 5000 --leaves 100000
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from holidays import Poland
+from workdays import WorkingDayCalendar, summarize_by_user
+
+
+def generate_leaves(users: int, leaves: int, year: int, seed: int = 0):
+    rnd = random.Random(seed)
+    start = date(year - 1, 12, 1)
+    rows = []
+    for _ in range(leaves):
+        date_from = start + timedelta(days=rnd.randint(0, 420))
+        rows.append((rnd.randint(1, users), date_from, date_from + timedelta(days=rnd.randint(0, 14))))
+    return rows
+
+
+def summary_loop(user_ids, rows, year, holidays, today):
+    # dotychczasowa implementacja z main.dashboard
+    result = {}
+    for user_id in user_ids:
+        user_leaves = [r for r in rows if r[0] == user_id]
+        days_past = 0
+        days_future = 0
+        for _, date_from, date_to in user_leaves:
+            start = max(date_from, date(year, 1, 1))
+            end = min(date_to, date(year, 12, 31))
+            current = start
+            while current <= end:
+                if current.weekday() < 5 and current not in holidays:
+                    if current <= today:
+                        days_past += 1
+                    else:
+                        days_future += 1
+                current += timedelta(days=1)
+        if days_past or days_future:
+            result[user_id] = (days_past, days_future)
+    return result
+
+
+def summary_engine(rows, year, holidays, today):
+    calendar = WorkingDayCalendar(year, holidays)
+    return {k: v for k, v in summarize_by_user(calendar, rows, today).items() if v != (0, 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--leaves", type=int, default=100000)
+    parser.add_argument("--year", type=int, default=date.today().year)
+    parser.add_argument("--loop-users", type=int, default=200,
+                        help="stara pętla jest O(users x leaves), mierzymy ją na próbce użytkowników i ekstrapolujemy")
+    args = parser.parse_args()
+
+    rows = generate_leaves(args.users, args.leaves, args.year)
+    holidays = set(Poland(years=args.year).keys())
+    today = date(args.year, 6, 30)
+
+    t0 = time.perf_counter()
+    engine_result = summary_engine(rows, args.year, holidays, today)
+    engine_time = time.perf_counter() - t0
+
+    sample = list(range(1, min(args.loop_users, args.users) + 1))
+    t0 = time.perf_counter()
+    loop_result = summary_loop(sample, rows, args.year, holidays, today)
+    loop_time = (time.perf_counter() - t0) * args.users / len(sample)
+
+    for user_id in sample:
+        assert loop_result.get(user_id, (0, 0)) == engine_result.get(user_id, (0, 0)), user_id
+
+    print(f"użytkownicy: {args.users}, urlopy: {args.leaves}, rok: {args.year}")
+    print(f"stara pętla (ekstrapolacja z {len(sample)} użytkowników): {loop_time:.2f} s")
+    print(f"silnik dni roboczych: {engine_time * 1000:.1f} ms")
+    print(f"przyspieszenie: {loop_time / engine_time:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Czas startu i pamięć na worker pod gunicornem: z preload_app i bez
+# Uruchomienie z katalogu głównego (wymaga gunicorn i uvicorn): python benchmarks/bench_workers.py --workers 4
+# RSS liczy współdzielone strony w każdym procesie, PSS dzieli je między procesy - ta druga pokazuje zysk z fork
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def memory_kb(pid: int):
+    # (rss, pss) w kB z /proc/<pid>/smaps_rollup (Linux)
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            match = re.match(r"(Rss|Pss):\s+(\d+) kB", line)
+            if match:
+                values[match.group(1)] = int(match.group(2))
+    return values["Rss"], values["Pss"]
+
+
+def children(pid: int):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def run(workers: int, preload: bool, port: int, timeout: float):
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        PRELOAD_APP=str(preload).lower(),
+        BIND=f"127.0.0.1:{port}",
+        OUTBOX_WORKER_ENABLED="false",
+        SECRET_KEY="benchmark",
+    )
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "urlopy_bench_workers.db"))
+    # gunicorn.conf.py nie uruchomi kilku workerów bez wspólnego stanu
+    env.setdefault("STATE_BACKEND", "redis")
+    env.setdefault("STATE_REDIS_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "urlopy_bench_workers_state.db"))
+    log_path = os.path.join(tempfile.gettempdir(), f"urlopy_bench_workers_{port}.log")
+    started = time.perf_counter()
+    with open(log_path, "w") as log:
+        master = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py"],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        # gotowe, gdy każdy worker zgłosi "Application startup complete"
+        while True:
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(open(log_path).read()[-2000:])
+            if open(log_path).read().count("Application startup complete") >= workers:
+                break
+            time.sleep(0.05)
+        ready = time.perf_counter() - started
+
+        for _ in range(workers * 20):  # kilka żądań, żeby każdy worker wyrenderował szablony
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/login").read()
+
+        master_rss, master_pss = memory_kb(master.pid)
+        usage = [memory_kb(pid) for pid in children(master.pid)]
+    finally:
+        master.terminate()
+        master.wait(timeout=30)
+
+    return {
+        "ready_s": ready,
+        "master_rss_mb": master_rss / 1024,
+        "worker_rss_mb": sum(rss for rss, _ in usage) / len(usage) / 1024,
+        "worker_pss_mb": sum(pss for _, pss in usage) / len(usage) / 1024,
+        "total_pss_mb": (master_pss + sum(pss for _, pss in usage)) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    print(f"workery: {args.workers}")
+    print(f"{'preload_app':<12} {'start s':>8} {'master RSS':>11} {'worker RSS':>11} {'worker PSS':>11} {'razem PSS':>10}")
+    for preload in (False, True):
+        r = run(args.workers, preload, args.port, args.timeout)
+        print(f"{str(preload):<12} {r['ready_s']:>8.2f} {r['master_rss_mb']:>9.1f}MB {r['worker_rss_mb']:>9.1f}MB "
+              f"{r['worker_pss_mb']:>9.1f}MB {r['total_pss_mb']:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
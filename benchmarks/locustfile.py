@@ -0,0 +1,77 @@
+# Test obciążeniowy z ruchem mieszanym (odczyty widoków + zapisy urlopów) dla działającego serwera
+# Wymaga: pip install locust; osobna baza benchmarku wypełniona przez:
+#   python benchmarks/bench_endpoints.py --seed-only --database-url postgresql://.../urlopy_bench
+# (seed kasuje tabele i tworzy użytkowników user1..userN z hasłem "haslo-benchmark"; serwer z tym samym DATABASE_URL)
+# Uruchomienie (kilka workerów tylko ze wspólnym stanem - inaczej zapis podbija wersję widoków w jednym workerze,
+# a pozostałe serwują stare listy):
+#   SECRET_KEY=bench STATE_BACKEND=redis STATE_REDIS_URL=sqlite:////tmp/urlopy-bench-state.db \
+#   WEB_CONCURRENCY=4 gunicorn main:app -c gunicorn.conf.py
+#   locust -f benchmarks/locustfile.py --host http://localhost:8000 -u 200 -r 20 --headless -t 2m
+import os
+import random
+from datetime import date, timedelta
+from locust import HttpUser, between, task
+
+USERS = int(os.getenv("BENCH_USERS", 200))
+PASSWORD = os.getenv("BENCH_PASSWORD", "haslo-benchmark")
+YEAR = date.today().year
+
+
+class Employee(HttpUser):
+    weight = 10
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.user_id = random.randint(1, USERS)
+        self.client.post("/login", data={"name": f"user{self.user_id}", "password": PASSWORD})
+
+    @task(5)
+    def calendar(self):
+        self.client.get("/leaves/calendar")
+        month = random.randint(1, 11)
+        self.client.get(f"/leaves/events?start={YEAR}-{month:02d}-01&end={YEAR}-{month + 1:02d}-01",
+                        name="/leaves/events")
+
+    @task(4)
+    def leaves_html(self):
+        self.client.get("/leaves/html")
+
+    @task(2)
+    def my_leaves(self):
+        self.client.get("/leaves/my")
+
+    @task(2)
+    def dashboard(self):
+        self.client.get(f"/dashboard?year={YEAR}", name="/dashboard")
+
+    @task(1)
+    def request_leave(self):
+        # nakładający się urlop (409) to poprawna odpowiedź, nie błąd testu
+        day = date(YEAR, 1, 1) + timedelta(days=random.randint(0, 360))
+        with self.client.post("/leaves/form", data={
+            "date_from": day.isoformat(),
+            "date_to": (day + timedelta(days=random.randint(0, 4))).isoformat(),
+        }, name="/leaves/form", catch_response=True, allow_redirects=False) as response:
+            if response.status_code in (303, 409):
+                response.success()
+
+
+class Admin(HttpUser):
+    weight = 1
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        self.client.post("/login", data={"name": "user1", "password": PASSWORD})
+
+    @task(3)
+    def dashboard(self):
+        self.client.get(f"/dashboard?year={YEAR}", name="/dashboard")
+
+    @task(2)
+    def filtered_list(self):
+        self.client.get(f"/leaves/html?status=upcoming&user_id={random.randint(1, USERS)}", name="/leaves/html?filtered")
+
+    @task(1)
+    def absences(self):
+        start = date(YEAR, 1, 1) + timedelta(days=random.randint(0, 330))
+        self.client.get(f"/leaves/absences?date_from={start}&date_to={start + timedelta(days=30)}", name="/leaves/absences")
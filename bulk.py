@@ -0,0 +1,244 @@
+# Masowy import i eksport urlopów (CSV / JSONL), przetwarzany strumieniowo w paczkach
+# Uruchomienie z linii poleceń:
+#   python bulk.py import urlopy.csv          (kolumny: email lub name, date_from, date_to, comment)
+#   python bulk.py export urlopy.jsonl --format jsonl
+#   python bulk.py export urlopy_2024.csv.gz --year 2024   (urlopy zaczynające się w danym roku, plik .gz kompresowany)
+import argparse
+import csv
+import gzip
+import io
+import json
+from itertools import islice
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from models import Leave, User
+from schemas import LeaveCreate
+import balances
+import overlaps
+import partitions
+from occupancy import occupancy
+import config
+
+EXPORT_COLUMNS = ["id", "email", "name", "date_from", "date_to", "comment"]
+
+
+def detect_format(filename: str, default: str = "csv") -> str:
+    name = filename.lower().removesuffix(".gz") if filename else ""
+    return "jsonl" if name.endswith((".jsonl", ".ndjson")) else default
+
+
+def open_file(path: str, mode: str = "r"):
+    # plik tekstowy, .gz rozpakowywany/kompresowany w locie
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def iter_records(stream, fmt: str):
+    # (numer_wiersza, słownik) - plik czytany linia po linii, bez wczytywania całości
+    if fmt == "jsonl":
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e
+                continue
+            yield line_no, record if isinstance(record, dict) else ValueError("oczekiwano obiektu JSON")
+    else:
+        # nagłówek to linia 1, dane od linii 2
+        for line_no, record in enumerate(csv.DictReader(stream), start=2):
+            yield line_no, record
+
+
+def build_user_map(db: Session):
+    # email (małe litery) / nazwa -> id; budowane raz na cały import
+    user_map = {}
+    for user_id, email, name in db.execute(select(User.id, User.email, User.name)):
+        user_map[email.lower()] = user_id
+        user_map[name] = user_id
+    return user_map
+
+
+def _resolve_user(record: dict, user_map: dict):
+    # ValueError dla wartości, które nie są tekstem (np. {"email": 5} w JSONL) - błąd wiersza, nie całego importu
+    email = record.get("email") or ""
+    name = record.get("name") or ""
+    if not isinstance(email, str) or not isinstance(name, str):
+        raise ValueError("email i name muszą być tekstem")
+    email, name = email.strip().lower(), name.strip()
+    return user_map.get(email) if email else user_map.get(name)
+
+
+def _insert_rows(db: Session, rows):
+    # id nowych urlopów w kolejności rows; None dla COPY (tylko PostgreSQL, gdzie drzewo przedziałów nie działa)
+    if config.BULK_USE_COPY and db.get_bind().dialect.driver == "psycopg2":
+        # PostgreSQL COPY - najszybsza ścieżka dla milionów wierszy
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row["user_id"], row["date_from"], row["date_to"], row["comment"]])
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert("COPY leaves (user_id, date_from, date_to, comment) FROM STDIN WITH (FORMAT csv)", buffer)
+        return None
+    # executemany
+    return db.execute(insert(Leave).returning(Leave.id, sort_by_parameter_order=True), rows).scalars().all()
+
+
+def _drop_overlapping(db: Session, candidates, errors):
+    # odrzuca wiersze nachodzące na urlopy w bazie albo wcześniejsze wiersze tej samej paczki (tego samego użytkownika);
+    # istniejące urlopy z zakresu paczki trafiają do drzewa przedziałów - jedno zapytanie na paczkę
+    first = min(row["date_from"] for _, row in candidates)
+    last = max(row["date_to"] for _, row in candidates)
+    user_ids = {row["user_id"] for _, row in candidates}
+    query = select(Leave.user_id, Leave.date_from, Leave.date_to).where(
+        Leave.user_id.in_(user_ids), partitions.period_overlaps(db, first, last)
+    )
+    existing = overlaps.IntervalTree((date_from, date_to, user_id) for user_id, date_from, date_to in db.execute(query))
+    accepted, taken = [], {}
+    for line_no, row in candidates:
+        user_id, date_from, date_to = row["user_id"], row["date_from"], row["date_to"]
+        if user_id in existing.overlapping(date_from, date_to) or any(
+            start <= date_to and end >= date_from for start, end in taken.get(user_id, ())
+        ):
+            errors.append((line_no, "urlop nakłada się na istniejący"))
+            continue
+        taken.setdefault(user_id, []).append((date_from, date_to))
+        accepted.append(row)
+    return accepted
+
+def import_leaves(db: Session, records, chunk_size: int = None):
+    # zwraca {"imported": liczba, "errors": [(numer_wiersza, komunikat), ...]}; commit po każdej paczce
+    chunk_size = chunk_size or config.BULK_CHUNK_SIZE
+    user_map = build_user_map(db)
+    imported, errors = 0, []
+    records = iter(records)
+
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        candidates = []
+        for line_no, record in chunk:
+            if isinstance(record, Exception):
+                errors.append((line_no, f"nieprawidłowy wiersz: {record}"))
+                continue
+            try:
+                user_id = _resolve_user(record, user_map)
+            except ValueError as e:
+                errors.append((line_no, str(e)))
+                continue
+            if user_id is None:
+                errors.append((line_no, "nieznany użytkownik"))
+                continue
+            try:
+                leave = LeaveCreate(
+                    date_from=record.get("date_from"),
+                    date_to=record.get("date_to"),
+                    comment=record.get("comment") or None,
+                )
+            except ValidationError as e:
+                errors.append((line_no, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())))
+                continue
+            if leave.date_to < leave.date_from:
+                errors.append((line_no, "date_to wcześniejsza niż date_from"))
+                continue
+            if leave.date_to > leave.date_from + partitions.MAX_LEAVE_SPAN:
+                errors.append((line_no, f"urlop dłuższy niż {config.MAX_LEAVE_DAYS} dni"))
+                continue
+            candidates.append((line_no, {"user_id": user_id, "date_from": leave.date_from, "date_to": leave.date_to, "comment": leave.comment}))
+
+        rows = _drop_overlapping(db, candidates, errors) if candidates else []
+        if rows:
+            ids = _insert_rows(db, rows)
+            balances.apply_leave_deltas(db, ((row["user_id"], row["date_from"], row["date_to"], 1) for row in rows))
+            db.commit()
+            if ids is None:
+                overlaps.leave_index.invalidate()
+            else:
+                overlaps.leave_index.add(db, (
+                    (leave_id, row["user_id"], row["date_from"], row["date_to"]) for leave_id, row in zip(ids, rows)
+                ))
+            for row in rows:
+                occupancy.apply(row["date_from"], row["date_to"])
+            imported += len(rows)
+
+    errors.sort()
+    return {"imported": imported, "errors": errors}
+
+
+def import_file(session_factory, stream, fmt: str):
+    db = session_factory()
+    try:
+        return import_leaves(db, iter_records(stream, fmt))
+    finally:
+        db.close()
+
+
+def export_leaves(session_factory, fmt: str = "csv", batch_size: int = 5000, year: int = None):
+    # generator kawałków tekstu - wiersze pobierane kursorem po stronie serwera, paczkami;
+    # year - tylko urlopy zaczynające się w danym roku (jedna partycja w PostgreSQL)
+    db = session_factory()
+    try:
+        query = (
+            select(Leave.id, User.email, User.name, Leave.date_from, Leave.date_to, Leave.comment)
+            .join(User, Leave.owner)
+            .order_by(Leave.id)
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+        if year is not None:
+            query = query.where(partitions.starts_in_year(year))
+        result = db.execute(query)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(EXPORT_COLUMNS)
+        for partition in result.partitions():
+            for row in partition:
+                if fmt == "jsonl":
+                    item = dict(zip(EXPORT_COLUMNS, row))
+                    item["date_from"] = item["date_from"].isoformat()
+                    item["date_to"] = item["date_to"].isoformat()
+                    buffer.write(json.dumps(item, ensure_ascii=False) + "\n")
+                else:
+                    writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def export_file(session_factory, path: str, fmt: str = None, year: int = None):
+    with open_file(path, "w") as f:
+        for chunk in export_leaves(session_factory, fmt or detect_format(path), year=year):
+            f.write(chunk)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Import i eksport urlopów")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"])
+    parser.add_argument("--year", type=int, help="export: tylko urlopy zaczynające się w danym roku")
+    args = parser.parse_args()
+    fmt = args.format or detect_format(args.path)
+
+    if args.command == "import":
+        with open_file(args.path) as f:
+            report = import_file(SessionLocal, f, fmt)
+        from response_cache import cache
+        cache.bump("leaves")  # wspólne wersje (STATE_BACKEND=redis) - workery przestają serwować stare widoki
+        for line_no, message in report["errors"]:
+            print(f"wiersz {line_no}: {message}")
+        print(f"Zaimportowano {report['imported']} urlopów, błędy: {len(report['errors'])}")
+    else:
+        export_file(SessionLocal, args.path, fmt, year=args.year)
+        print(f"Zapisano {args.path}")
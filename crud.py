@@ -1,11 +1,43 @@
+from sqlalchemy import Date, case, cast, exists, extract, func, literal_column, select, true, tuple_, union
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
-from models import Leave
+from models import Leave, Holiday
 from models import User as Userm
 from schemas import LeaveCreate, UserCreate
 from datetime import timedelta, date
-from holidays import Poland
+from typing import NamedTuple, Optional
+import workdays
+import balances
+import outbox
+import overlaps
+import partitions
+from occupancy import occupancy
+import passwords
+import user_cache
+import config
 
-def create_leave(db: Session, leave: LeaveCreate, user_id: int):
+class LeaveRecord(NamedTuple):
+    # wiersz list urlopów (leaves.html, my_leaves.html) - zwykła krotka zamiast obiektu ORM
+    id: int
+    user_id: int
+    date_from: date
+    date_to: date
+    comment: Optional[str]
+    owner_name: Optional[str] = None
+
+def _commit_leave(db: Session):
+    # w PostgreSQL równoległy zapis może jeszcze trafić na ograniczenie EXCLUDE (ex_leaves_user_period)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if overlaps.is_exclusion_violation(e):
+            raise overlaps.LeaveConflictError("Urlop nakłada się na istniejący") from e
+        raise
+
+def create_leave(db: Session, leave: LeaveCreate, user_id: int, notify_admins: bool = False):
+    # LeaveConflictError, jeśli daty są odwrócone albo użytkownik ma już urlop w tym zakresie
+    overlaps.validate_leave(db, user_id, leave.date_from, leave.date_to)
     db_leave = Leave(
         user_id=user_id,
         date_from=leave.date_from,
@@ -13,27 +45,195 @@ def create_leave(db: Session, leave: LeaveCreate, user_id: int):
         comment=leave.comment,
     )
     db.add(db_leave)
-    db.commit()
+    balances.apply_leave_delta(db, user_id, db_leave.date_from, db_leave.date_to)
+    if notify_admins:
+        outbox.enqueue_leave_notification(db, db_leave)  # e-maile wysyła w tle OutboxWorker
+    _commit_leave(db)
+    occupancy.apply(db_leave.date_from, db_leave.date_to)
+    db.refresh(db_leave)
+    overlaps.leave_index.add(db, [(db_leave.id, user_id, db_leave.date_from, db_leave.date_to)])
+    return db_leave
+
+def update_leave(db: Session, db_leave: Leave, date_from: date, date_to: date, comment):
+    overlaps.validate_leave(db, db_leave.user_id, date_from, date_to, exclude_id=db_leave.id)
+    old_from, old_to = db_leave.date_from, db_leave.date_to
+    # stare dni odejmujemy, nowe dodajemy - tylko różnica trafia do leave_balances
+    balances.apply_leave_deltas(db, [
+        (db_leave.user_id, old_from, old_to, -1),
+        (db_leave.user_id, date_from, date_to, 1),
+    ])
+    db_leave.date_from = date_from
+    db_leave.date_to = date_to
+    db_leave.comment = comment
+    _commit_leave(db)
+    occupancy.apply(old_from, old_to, sign=-1)
+    occupancy.apply(date_from, date_to)
     db.refresh(db_leave)
+    overlaps.leave_index.add(db, [(db_leave.id, db_leave.user_id, date_from, date_to)])
     return db_leave
 
-def get_leaves(db: Session):
-    return db.query(Leave).options(joinedload(Leave.owner)).all()
+def delete_leave(db: Session, db_leave: Leave):
+    balances.apply_leave_delta(db, db_leave.user_id, db_leave.date_from, db_leave.date_to, sign=-1)
+    leave_id, date_from, date_to = db_leave.id, db_leave.date_from, db_leave.date_to
+    db.delete(db_leave)
+    db.commit()
+    overlaps.leave_index.remove([leave_id])
+    occupancy.apply(date_from, date_to, sign=-1)
+
+def get_leave(db: Session, leave_id: int):
+    # owner od razu - formularz edycji wyświetla imię, a w trybie async leniwe ładowanie nie działa
+    return db.query(Leave).options(joinedload(Leave.owner)).filter_by(id=leave_id).first()
 
-def create_user(db: Session, user: UserCreate):
+def get_user_leaves(db: Session, user_id: int):
+    # tylko kolumny potrzebne na liście "Moje urlopy", po indeksie (user_id, date_from)
+    query = (
+        select(Leave.id, Leave.user_id, Leave.date_from, Leave.date_to, Leave.comment)
+        .where(Leave.user_id == user_id)
+        .order_by(Leave.date_from, Leave.id)
+    )
+    return [LeaveRecord(*row) for row in db.execute(query)]
+
+def get_leave_events(db: Session, start: date, end: date):
+    # urlopy nachodzące na [start, end) - tylko kolumny potrzebne w kalendarzu
+    query = (
+        select(Leave.id, Leave.user_id, Leave.date_from, Leave.date_to, Userm.name)
+        .join(Userm, Leave.owner)
+        .where(partitions.period_overlaps(db, start, end - timedelta(days=1)))
+        .order_by(Leave.date_from, Leave.id)
+    )
+    return db.execute(query).all()
+
+def get_leaves_page(db: Session, user_id: int = None, date_from: date = None, date_to: date = None,
+                    status: str = None, after=None, limit: int = 50, today: date = None):
+    # strona urlopów w kolejności (date_from, id); after = (date_from, id) ostatniego wiersza poprzedniej strony;
+    # warunki na date_from z obu stron - w PostgreSQL tylko partycje lat z zakresu
+    today = today or date.today()
+    query = select(
+        Leave.id, Leave.user_id, Leave.date_from, Leave.date_to, Leave.comment,
+        Userm.name.label("owner_name")
+    ).join(Userm, Leave.owner)
+
+    if user_id:
+        query = query.where(Leave.user_id == user_id)
+    if date_from:
+        query = query.where(partitions.ends_on_or_after(db, date_from))
+    if date_to:
+        query = query.where(Leave.date_from <= date_to)
+    if status == "upcoming":
+        query = query.where(partitions.ends_on_or_after(db, today))
+    elif status == "past":
+        query = query.where(Leave.date_to < today, Leave.date_from < today)
+    if after:
+        query = query.where(tuple_(Leave.date_from, Leave.id) > tuple_(*after))
+
+    return [LeaveRecord(*row) for row in db.execute(query.order_by(Leave.date_from, Leave.id).limit(limit))]
+
+def create_user(db: Session, user: UserCreate, hashed_password: str = None):
+    # hasło zawsze zapisywane jako hash bcrypt; endpointy liczą go wcześniej, poza sesją bazy
+    if hashed_password is None:
+        hashed_password = passwords.hash_password_sync(user.password)
     db_user = Userm(
         email=user.email,
         name=user.name,
-        password=user.password,
+        password=hashed_password,
         role=user.role
     )
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.users.invalidate(db_user.id)
     return db_user
 
 def get_users(db: Session):
     return db.query(Userm).all()
 
+def get_user_choices(db: Session):
+    # (id, name) do list wyboru użytkownika
+    return db.execute(select(Userm.id, Userm.name).order_by(Userm.name)).all()
+
+def get_user(db: Session, user_id: int):
+    return db.get(Userm, user_id)
+
+def get_user_by_name(db: Session, name: str):
+    return db.query(Userm).filter_by(name=name).first()
+
+def set_user_password(db: Session, user: Userm, hashed_password: str):
+    user.password = hashed_password
+    db.commit()
+    user_cache.users.invalidate(user.id)
+
 def get_polish_holidays(year: int):
-    return set(Poland(years=year).keys())
+    return workdays.get_holidays(year)
+
+def get_leave_years(db: Session):
+    # lata, w których występują urlopy - bez ładowania wszystkich wierszy
+    query = union(
+        select(extract("year", Leave.date_from)),
+        select(extract("year", Leave.date_to)),
+    )
+    return sorted(int(year) for (year,) in db.execute(query) if year is not None)
+
+def get_year_leave_rows(db: Session, year: int):
+    # (user_id, date_from, date_to) urlopów nachodzących na dany rok
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    query = select(Leave.user_id, Leave.date_from, Leave.date_to).where(partitions.period_overlaps(db, first, last))
+    return db.execute(query).all()
+
+def _year_leave_days(db: Session, year: int):
+    # podzapytanie (user_id, day) - każdy dzień roboczy urlopu przycięty do danego roku
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    overlaps_year = partitions.period_overlaps(db, first, last)
+
+    if db.get_bind().dialect.name == "postgresql":
+        series = func.generate_series(
+            func.greatest(Leave.date_from, first),
+            func.least(Leave.date_to, last),
+            literal_column("interval '1 day'"),
+        ).table_valued("value").lateral("series")
+        day = cast(series.c.value, Date)
+        return (
+            select(Leave.user_id.label("user_id"), day.label("day"))
+            .select_from(Leave)
+            .join(series, true())
+            .where(overlaps_year, extract("isodow", day) < 6)
+            .subquery("leave_days")
+        )
+
+    # SQLite i inne - rekurencyjne CTE zamiast generate_series
+    days = (
+        select(
+            Leave.user_id.label("user_id"),
+            func.max(Leave.date_from, first, type_=Date).label("day"),
+            func.min(Leave.date_to, last, type_=Date).label("end_day"),
+        )
+        .where(overlaps_year)
+        .cte("leave_days", recursive=True)
+    )
+    days = days.union_all(
+        select(days.c.user_id, func.date(days.c.day, "+1 day", type_=Date), days.c.end_day)
+        .where(days.c.day < days.c.end_day)
+    )
+    return (
+        select(days.c.user_id, days.c.day)
+        .where(func.strftime("%w", days.c.day).notin_(["0", "6"]))
+        .subquery("working_leave_days")
+    )
+
+def get_year_summary_sql(db: Session, year: int, today: date):
+    # {user_id: (dni_przeszłe, dni_przyszłe)} liczone w bazie, bez świąt i weekendów
+    days = _year_leave_days(db, year)
+    if config.HOLIDAYS_PERSIST:
+        workdays.ensure_holidays_table(db, year)
+        not_holiday = ~exists().where(Holiday.day == days.c.day)
+    else:
+        not_holiday = days.c.day.notin_(sorted(get_polish_holidays(year)))
+    query = (
+        select(
+            days.c.user_id,
+            func.sum(case((days.c.day <= today, 1), else_=0)),
+            func.sum(case((days.c.day > today, 1), else_=0)),
+        )
+        .where(not_holiday)
+        .group_by(days.c.user_id)
+    )
+    return {user_id: (int(past), int(future)) for user_id, past, future in db.execute(query)}
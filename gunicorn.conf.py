@@ -0,0 +1,50 @@
+# Konfiguracja gunicorna - kilka workerów uvicorn na jednym hoście
+# Uruchomienie: gunicorn main:app -c gunicorn.conf.py
+# Dla spójności między workerami ustaw SECRET_KEY oraz STATE_BACKEND=redis (STATE_REDIS_URL=redis://...
+# albo sqlite:///ścieżka jako zamiennik na jednym hoście), patrz config.py
+import multiprocessing
+import os
+import config as app_config  # nie "config" - to nazwa ustawienia gunicorna
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# wersje tabel (response_cache) i limity logowań w pamięci procesu: zapis podbija wersję tylko w swoim workerze,
+# a pozostałe serwują stare widoki do CACHE_TTL_SECONDS - kilka workerów tylko ze wspólnym stanem
+if workers > 1 and (app_config.STATE_BACKEND != "redis" or app_config.STATE_REDIS_URL == "fake"):
+    raise SystemExit(
+        f"{workers} workerów wymaga wspólnego stanu: STATE_BACKEND=redis i STATE_REDIS_URL=redis://... "
+        f"albo sqlite:///ścieżka (jeden host); dla jednego procesu WEB_CONCURRENCY=1"
+    )
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+# za reverse proxy: adresy proxy, którym wolno podać adres klienta w X-Forwarded-For (limit logowań na IP,
+# config.LOGIN_MAX_FAILURES_PER_IP); bez tego wszyscy użytkownicy mają adres proxy
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# aplikacja (modele, szablony, kalendarze świąt) ładowana raz w procesie głównym, workery powstają przez fork
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+
+def when_ready(server):
+    if preload_app:
+        import main
+        main.preload()
+
+
+def post_fork(server, worker):
+    # połączenia z bazy nie mogą być współdzielone z procesem głównym - każdy worker otwiera własne
+    import database
+    database.engine.dispose(close=False)
+    if database.async_engine is not None:
+        database.async_engine.sync_engine.dispose(close=False)
+    # to samo dla połączeń SQLite stanu współdzielonego (STATE_REDIS_URL / CACHE_REDIS_URL=sqlite:///...)
+    import response_cache
+    import state
+    for client in (state.client, getattr(response_cache.cache.backend, "client", None)):
+        if isinstance(client, state.SqliteRedis):
+            client.reset_after_fork()
+    # pula hashowania haseł (PASSWORD_HASH_POOL=process) nie może być dzielona z procesem głównym
+    import passwords
+    passwords.reset_after_fork()
@@ -0,0 +1,123 @@
+# Pomiary żądań HTTP i zapytań SQL: histogram czasu na trasę, liczba i czas zapytań na żądanie,
+# wykrywanie N+1 (to samo zapytanie wiele razy w jednym żądaniu) i log wolnych żądań
+import logging
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+import config
+import metrics
+
+logger = logging.getLogger("urlopy.requests")
+
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+metrics.describe("http_requests_total", "Liczba żądań HTTP")
+metrics.describe("http_request_duration_seconds", "Czas obsługi żądania HTTP")
+metrics.describe("http_request_db_queries", "Liczba zapytań SQL w jednym żądaniu")
+metrics.describe("http_request_db_seconds", "Łączny czas zapytań SQL w jednym żądaniu")
+metrics.describe("db_query_duration_seconds", "Czas pojedynczego zapytania SQL")
+metrics.describe("db_n_plus_one_total", "Żądania, w których to samo zapytanie wykonano co najmniej N_PLUS_ONE_THRESHOLD razy")
+
+
+class RequestStats:
+    # zapytania bieżącego żądania; obiekt współdzielony przez ContextVar także z pulą wątków (run_in_threadpool)
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = {}  # sql -> [liczba, czas]
+
+    def record(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def repeated(self, threshold: int):
+        return [(sql, count) for sql, (count, _) in self.statements.items() if count >= threshold]
+
+    def breakdown(self, limit: int = 5):
+        top = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return "; ".join(f"{count}x {seconds * 1000:.1f} ms {' '.join(sql.split())[:200]}" for sql, (count, seconds) in top)
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # czas startu w kontekście wykonania, nie w conn.info - po błędzie zapytania znika razem z kontekstem
+    context.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context.query_started
+    metrics.observe("db_query_duration_seconds", seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+
+
+def instrument_engine(engine):
+    # silnik synchroniczny albo async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _route_name(scope) -> str:
+    # szablon ścieżki (/leaves/edit/{leave_id}), żeby nie mnożyć etykiet dla każdego id
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+class RequestMetricsMiddleware:
+    # czyste ASGI - mierzy do wysłania ostatniego fragmentu odpowiedzi (także StreamingResponse)
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            self._record(scope, status, elapsed, stats)
+
+    def _record(self, scope, status, elapsed, stats):
+        route = _route_name(scope)
+        method = scope["method"]
+        metrics.inc("http_requests_total", method=method, route=route, status=status)
+        metrics.observe("http_request_duration_seconds", elapsed, method=method, route=route)
+        metrics.observe("http_request_db_queries", stats.queries, buckets=QUERY_COUNT_BUCKETS, route=route)
+        metrics.observe("http_request_db_seconds", stats.db_seconds, route=route)
+
+        repeated = stats.repeated(config.N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            metrics.inc("db_n_plus_one_total", route=route)
+            for sql, count in repeated:
+                logger.warning("N+1: %s %s - %dx %s", method, route, count, " ".join(sql.split())[:200])
+
+        if config.SLOW_REQUEST_SECONDS and elapsed >= config.SLOW_REQUEST_SECONDS:
+            logger.warning(
+                "wolne żądanie: %s %s %d - %.0f ms, zapytań: %d (%.0f ms): %s",
+                method, route, status, elapsed * 1000, stats.queries, stats.db_seconds * 1000, stats.breakdown(),
+            )
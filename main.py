@@ -1,24 +1,101 @@
-from fastapi import FastAPI, Depends, HTTPException, Header, Request, Form
+from fastapi import FastAPI, Depends, HTTPException, Header, Request, Form, File, UploadFile
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session 
-from database import engine, SessionLocal
-from models import Base, User as Userm, Leave
+from database import SessionLocal, AsyncSessionLocal, init_db, run_db
+from models import User as Userm
 from schemas import LeaveCreate, Leave as LeaveSchema, UserCreate, User
 from starlette.middleware.sessions import SessionMiddleware
 from datetime import date, timedelta
 from typing import Optional
 from fastapi import Request, Query
 import crud
-from crud import get_polish_holidays
-import bcrypt
+import balances
+import config
+import workdays
+import outbox
+import overlaps
+from occupancy import occupancy
+import metrics
+import instrumentation
+from workdays import summarize_by_user
+import passwords
+import user_cache
+import response_cache
+import bulk
+import io
+import os
+import secrets
+import warnings
+from starlette.concurrency import run_in_threadpool
 import smtplib
+import hashlib
+import json
+from urllib.parse import urlencode
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
-app.add_middleware(SessionMiddleware, secret_key="klucz")
-
-Base.metadata.create_all(bind=engine)
+templates.env.auto_reload = config.TEMPLATES_AUTO_RELOAD
+if config.TEMPLATE_BYTECODE_CACHE:
+    # skompilowane szablony na dysku - kolejne procesy (workery) nie parsują ich od nowa
+    if config.TEMPLATE_BYTECODE_CACHE_DIR:
+        os.makedirs(config.TEMPLATE_BYTECODE_CACHE_DIR, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(config.TEMPLATE_BYTECODE_CACHE_DIR)
+USER_COLORS = ['#007bff', '#28a745', '#dc3545', '#ffc107', '#6610f2', '#17a2b8', '#6f42c1', '#fd7e14']
+if not config.SECRET_KEY:
+    # losowy klucz procesu: sesje nie przeżyją restartu, a bez preload_app każdy worker ma inny klucz
+    warnings.warn("Brak SECRET_KEY - sesje podpisywane losowym kluczem tego procesu")
+app.add_middleware(
+    SessionMiddleware,
+    secret_key=config.SECRET_KEY or secrets.token_urlsafe(32),
+    https_only=config.SESSION_HTTPS_ONLY
+)
+if config.RESPONSE_COMPRESSION == "brotli":
+    from brotli_asgi import BrotliMiddleware  # opcjonalna zależność; klienci bez br dostają gzip
+    app.add_middleware(BrotliMiddleware, minimum_size=config.COMPRESSION_MIN_SIZE)
+elif config.RESPONSE_COMPRESSION == "gzip":
+    app.add_middleware(GZipMiddleware, minimum_size=config.COMPRESSION_MIN_SIZE)
+app.add_middleware(instrumentation.RequestMetricsMiddleware)  # najbardziej zewnętrzny - mierzy całe żądanie
+
+@app.on_event("startup")
+def create_tables():
+    if config.DB_INIT_ON_STARTUP:
+        init_db()
+
+@app.get("/metrics")
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+def start_outbox_worker():
+    if config.OUTBOX_WORKER_ENABLED:
+        app.state.outbox_worker = outbox.OutboxWorker(SessionLocal)
+        app.state.outbox_worker.start()
+
+@app.on_event("shutdown")
+def stop_outbox_worker():
+    worker = getattr(app.state, "outbox_worker", None)
+    if worker:
+        worker.stop(timeout=config.OUTBOX_POLL_SECONDS)
+
+def _warm_years():
+    this_year = date.today().year
+    return range(this_year - config.HOLIDAY_WARM_YEARS_BACK, this_year + config.HOLIDAY_WARM_YEARS_FORWARD + 1)
+
+def preload():
+    # gunicorn z preload_app (gunicorn.conf.py) woła to w procesie głównym przed fork - skompilowane szablony
+    # i kalendarze dni roboczych powstają raz i są współdzielone przez workery (copy-on-write); bez bazy danych
+    for name in templates.env.list_templates():
+        templates.get_template(name)
+    workdays.warm(_warm_years())
+
+@app.on_event("startup")
+def warm_holidays():
+    # tylko w pamięci - tabelę holidays wypełnia init_db, brakujące lata crud.get_year_summary_sql
+    workdays.warm(_warm_years())
 
 def require_login(request: Request):
     user_id = request.session.get("user_id")
@@ -27,110 +104,255 @@ def require_login(request: Request):
         return False
     return True
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(x_user_id: int = Header(...), db: Session = Depends(get_db)):
-    user = db.query(Userm).filter_by(id=x_user_id).first()
+async def get_db():
+    # DB_ASYNC=true - AsyncSession, w przeciwnym razie zwykła sesja; zapytania zawsze przez run_db
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+async def _cached(db, view: str, fn, *args, tables=("leaves", "users")):
+    # wynik fn(db, *args) z pamięci podręcznej widoków; klucz: widok, argumenty, dzisiejsza data i wersje tabel
+    key = response_cache.cache.key(view, tables, today=date.today(), args=args)
+    value = response_cache.cache.get(view, key)
+    if value is None:
+        value = await run_db(db, fn, *args)
+        response_cache.cache.set(key, value)
+    return value
+
+async def _fragment(name: str, tables, render, **params):
+    # wyrenderowany fragment szablonu z pamięci podręcznej; render() (zapytania + Jinja) tylko przy braku wpisu
+    view = "fragment:" + name
+    key = response_cache.cache.key(view, tables, today=date.today(), **params)
+    html = response_cache.cache.get(view, key)
+    if html is None:
+        html = await render()
+        response_cache.cache.set(key, html)
+    return Markup(html)
+
+def user_color(user_id: int) -> str:
+    # kolor użytkownika w kalendarzu - stały dla danego id, liczony po stronie serwera
+    return USER_COLORS[user_id % len(USER_COLORS)]
+
+def leaves_changed():
+    # po każdym zapisie urlopów - wpisy z poprzednią wersją tabeli przestają być trafiane
+    response_cache.cache.bump("leaves")
+
+async def get_current_user(x_user_id: int = Header(...), db: Session = Depends(get_db)):
+    # najpierw cache w procesie - baza tylko przy pierwszym użyciu albo po wygaśnięciu TTL
+    user = user_cache.users.get(x_user_id)
+    if user is None:
+        user = await run_db(db, user_cache.users.load, x_user_id)
     if not user:
         raise HTTPException(status_code=401, detail="Użytkownik nie istnieje")
     return user
 
 @app.post("/leaves/", response_model=LeaveSchema)
-def create_leave(leave: LeaveCreate, 
+async def create_leave(leave: LeaveCreate, 
                 db: Session = Depends(get_db),
                 current_user: Userm = Depends(get_current_user)):
-    return crud.create_leave(db=db, leave=leave, user_id=current_user.id)
+    try:
+        db_leave = await run_db(db, crud.create_leave, leave=leave, user_id=current_user.id)
+    except overlaps.LeaveConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    leaves_changed()
+    return db_leave
+
+def _encode_cursor(row) -> str:
+    return f"{row.date_from.isoformat()}_{row.id}"
+
+def _decode_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        date_part, id_part = cursor.split("_")
+        return date.fromisoformat(date_part), int(id_part)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy kursor")
+
+def _leaves_json(rows):
+    # serializacja wiersz po wierszu, bez budowania całej listy modeli Pydantic
+    yield "["
+    for i, row in enumerate(rows):
+        item = {
+            "id": row.id,
+            "user_id": row.user_id,
+            "date_from": row.date_from.isoformat(),
+            "date_to": row.date_to.isoformat(),
+            "comment": row.comment
+        }
+        yield ("," if i else "") + json.dumps(item, ensure_ascii=False)
+    yield "]"
 
 @app.get("/leaves/", response_model=list[LeaveSchema])
-def read_leaves(db: Session = Depends(get_db)):
-    return crud.get_leaves(db)
+async def read_leaves(
+    user_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[str] = Query(None, pattern="^(upcoming|past)$"),
+    year: Optional[int] = Query(None, ge=1900, le=9999),
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    if year is not None:
+        # urlopy nachodzące na rok - zakres dat zawężony do roku, w PostgreSQL czytane tylko jego partycje
+        date_from = max(date_from or date(year, 1, 1), date(year, 1, 1))
+        date_to = min(date_to or date(year, 12, 31), date(year, 12, 31))
+    rows = await run_db(db, crud.get_leaves_page, user_id=user_id, date_from=date_from, date_to=date_to,
+                        status=status, after=_decode_cursor(after), limit=limit)
+    # kursor następnej strony w nagłówku - treść pozostaje listą urlopów
+    headers = {"X-Next-Cursor": _encode_cursor(rows[-1])} if len(rows) == limit else {}
+    return StreamingResponse(_leaves_json(rows), media_type="application/json", headers=headers)
+
+def require_admin(current_user: Userm = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Tylko administrator może importować i eksportować urlopy")
+    return current_user
+
+@app.post("/leaves/import")
+async def import_leaves(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"),
+    current_user: Userm = Depends(require_admin)
+):
+    # plik czytany strumieniowo w osobnym wątku, zapis paczkami (COPY / executemany)
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    report = await run_in_threadpool(bulk.import_file, SessionLocal, stream, format or bulk.detect_format(file.filename))
+    leaves_changed()
+    return {
+        "imported": report["imported"],
+        "errors": [{"line": line_no, "error": message} for line_no, message in report["errors"]]
+    }
+
+@app.get("/leaves/export")
+def export_leaves(
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    year: Optional[int] = Query(None, ge=1900, le=9999),
+    current_user: Userm = Depends(require_admin)
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"urlopy_{year}.{format}" if year else f"urlopy.{format}"
+    return StreamingResponse(
+        bulk.export_leaves(SessionLocal, format, year=year),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @app.post("/users/", response_model=User)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    return crud.create_user(db=db, user=user)
+async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+    hashed_password = await passwords.hash_password(user.password)
+    db_user = await run_db(db, crud.create_user, user=user, hashed_password=hashed_password)
+    response_cache.cache.bump("users")  # listy użytkowników w filtrach i na dashboardzie
+    return db_user
 
 @app.get("/users/", response_model=list[User])
-def read_users(db: Session = Depends(get_db)):
-    return crud.get_users(db)
+async def read_users(db: Session = Depends(get_db)):
+    return await run_db(db, crud.get_users)
 
 @app.get("/me")
-def read_current_user(current_user: Userm = Depends(get_current_user)):
+async def read_current_user(current_user: Userm = Depends(get_current_user)):
     return {"id": current_user.id, "email": current_user.email, "role": current_user.role}
 
 @app.put("/leaves/{leave_id}", response_model=LeaveSchema)
-def update_leave(
+async def update_leave(
     leave_id: int,
     leave: LeaveCreate,
     db: Session = Depends(get_db),
     current_user: Userm = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Tylko administrator może edytować urlopy")
-    db_leave = db.query(Leave).filter_by(id=leave_id).first()
+    db_leave = await run_db(db, crud.get_leave, leave_id)
     if not db_leave:
         raise HTTPException(status_code=404, detail="Urlop nie istnieje")
-    db_leave.date_from = leave.date_from
-    db_leave.date_to = leave.date_to
-    db_leave.comment = leave.comment
-
-    db.commit()
-    db.refresh(db_leave)
+    try:
+        db_leave = await run_db(db, crud.update_leave, db_leave, leave.date_from, leave.date_to, leave.comment)
+    except overlaps.LeaveConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    leaves_changed()
     return db_leave
 
 @app.delete("/leaves/{leave_id}")
-def delete_leave(leave_id: int,
+async def delete_leave(leave_id: int,
                  db: Session = Depends(get_db),
                  current_user: Userm = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Tylko administrator może usuwać urlopy")
 
-    db_leave = db.query(Leave).filter_by(id=leave_id).first()
+    db_leave = await run_db(db, crud.get_leave, leave_id)
     if not db_leave:
         raise HTTPException(status_code=404, detail="Urlop nie istnieje")
 
-    db.delete(db_leave)
-    db.commit()
+    await run_db(db, crud.delete_leave, db_leave)
+    leaves_changed()
     return {"detail": "Urlop został usunięty"}
 
+def _leaves_html_page(db: Session, user_id, date_from, date_to, segments, segment, after):
+    page_size = config.LEAVES_PAGE_SIZE
+    leaves, next_page = [], None
+    for current in segments[segments.index(segment):]:
+        remaining = page_size - len(leaves)
+        page = crud.get_leaves_page(db, user_id=user_id, date_from=date_from, date_to=date_to,
+                                    status=current, after=after, limit=remaining + 1)
+        if len(page) > remaining:
+            leaves.extend(page[:remaining])
+            next_page = {"segment": current}
+            if remaining:
+                next_page["after"] = _encode_cursor(page[remaining - 1])
+            break
+        leaves.extend(page)
+        after = None
+
+    return leaves, next_page
+
 @app.get("/leaves/html", response_class=HTMLResponse)
-def get_leaves_html(request: Request, db: Session = Depends(get_db)):
+async def get_leaves_html(request: Request, db: Session = Depends(get_db)):
     if not require_login(request):
         return RedirectResponse("/login", status_code=303)
-    # user_id jako string
-    user_id_param = request.query_params.get("user_id")
+    params = request.query_params
 
-    # próba konwersji user_id do int jeśli podano wartość
+    # próba konwersji filtrów; jeśli się nie da — przekieruj bez filtra
     try:
-        user_id = int(user_id_param) if user_id_param else None
-    except ValueError:
-        # Jeśli user_id nie da się skonwertować — przekieruj bez filtra
+        user_id = int(params["user_id"]) if params.get("user_id") else None
+        date_from = date.fromisoformat(params["date_from"]) if params.get("date_from") else None
+        date_to = date.fromisoformat(params["date_to"]) if params.get("date_to") else None
+        after = _decode_cursor(params.get("after"))
+    except (ValueError, HTTPException):
         return RedirectResponse("/leaves/html", status_code=303)
 
-    query = db.query(Leave)
+    status = params.get("status") if params.get("status") in ("upcoming", "past") else None
+    # bez filtra najpierw nadchodzące, potem minione - każda część stronicowana po (date_from, id)
+    segments = [status] if status else ["upcoming", "past"]
+    segment = params.get("segment") if params.get("segment") in segments else segments[0]
 
-    if user_id:
-        query = query.filter(Leave.user_id == user_id)
+    leaves, next_page = await _cached(db, "leaves_html", _leaves_html_page, user_id, date_from, date_to, segments, segment, after)
 
-    all_leaves = query.all()
-    today = date.today()
+    async def render_user_options():
+        users = await run_db(db, crud.get_user_choices)
+        return templates.get_template("_user_options.html").render(users=users, selected_user_id=user_id)
 
-    upcoming = [l for l in all_leaves if l.date_to >= today]
-    past = [l for l in all_leaves if l.date_to < today]
-    upcoming.sort(key=lambda l: l.date_from)
-    past.sort(key=lambda l: l.date_from)
+    user_options = await _fragment("user_options", ("users",), render_user_options, selected=user_id)
 
-    sorted_leaves = upcoming + past
-    users = db.query(Userm).all()
+    next_url = None
+    if next_page:
+        filters = {"user_id": user_id, "date_from": date_from, "date_to": date_to, "status": status}
+        next_page.update({key: value for key, value in filters.items() if value})
+        next_url = "/leaves/html?" + urlencode(next_page)
 
     return templates.TemplateResponse("leaves.html", {
         "request": request,
-        "leaves": sorted_leaves,
-        "users": users,
-        "selected_user_id": user_id
+        "leaves": leaves,
+        "user_options": user_options,
+        "selected_user_id": user_id,
+        "selected_status": status,
+        "date_from": date_from,
+        "date_to": date_to,
+        "next_url": next_url
     })
 
 
@@ -141,7 +363,7 @@ def show_leave_form(request: Request):
     return templates.TemplateResponse("leave_form.html", {"request": request})
 
 @app.post("/leaves/form")
-def submit_leave_form(
+async def submit_leave_form(
     request: Request,
     date_from: str = Form(...),
     date_to: str = Form(...),
@@ -152,57 +374,60 @@ def submit_leave_form(
     if not user_id:
         return RedirectResponse("/login", status_code=303)
 
-    new_leave = Leave(
-        user_id=user_id,
-        date_from=date_from,
-        date_to=date_to,
-        comment=comment
-    )
-    db.add(new_leave)
-    db.commit()
-
-    from utils import send_leave_notification
-
-    admins = db.query(Userm).filter_by(role="admin").all()
-    admin_emails = [a.email for a in admins]
-
-    user = db.query(Userm).filter_by(id=user_id).first()
-
-    send_leave_notification(
-        admin_emails=admin_emails,
-        employee_name=user.name,
-        date_from=new_leave.date_from,
-        date_to=new_leave.date_to,
-        comment=new_leave.comment
-    )
+    try:
+        await run_db(
+            db,
+            crud.create_leave,
+            leave=LeaveCreate(date_from=date_from, date_to=date_to, comment=comment),
+            user_id=user_id,
+            notify_admins=True
+        )
+    except overlaps.LeaveConflictError as e:
+        return templates.TemplateResponse("leave_form.html", {"request": request, "error": str(e)}, status_code=409)
+    leaves_changed()
 
     return RedirectResponse(url="/leaves/html", status_code=303)
 
 @app.get("/login", response_class=HTMLResponse)
-def login_form(request: Request, db: Session = Depends(get_db)):
+def login_form(request: Request):
     if request.session.get("user_id"):
         return RedirectResponse(url="leaves/calendar", status_code=303)
 
     error = request.session.pop("login_required", None)
-    users = db.query(Userm).all()
     return templates.TemplateResponse("login.html", {
         "request": request,
-        "users": users,
         "error": error
     })
 
 @app.post("/login")
-def login(request: Request, db: Session = Depends(get_db), name: str = Form(...), password: str = Form(...)):
-    user = db.query(Userm).filter_by(name=name).first()
+async def login(request: Request, db: Session = Depends(get_db), name: str = Form(...), password: str = Form(...)):
+    # limit przed zapytaniem i bcryptem - zgadywanie haseł nie zużywa CPU; na adres IP osobny, wyższy limit,
+    # bo za NAT-em albo proxy jeden adres ma wielu użytkowników
+    user_key = f"user:{name}"
+    ip_key = f"ip:{request.client.host if request.client else '-'}"
+    if passwords.login_limiter.is_blocked(user_key) or passwords.ip_login_limiter.is_blocked(ip_key):
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": "Zbyt wiele nieudanych prób logowania. Spróbuj ponownie później",
+            "name": name
+        }, status_code=429)
+
+    user = await run_db(db, crud.get_user_by_name, name)
 
-    if not user or not verify_password(password, user.password):
-        users = db.query(Userm).all()
+    if not user or not await passwords.verify_password(password, user.password):
+        passwords.login_limiter.record_failure(user_key)
+        passwords.ip_login_limiter.record_failure(ip_key)
         return templates.TemplateResponse("login.html", {
             "request": request,
             "error": "Nieprawidłowa nazwa użytkownika lub hasło",
-            "users": users
+            "name": name
         }, status_code=401)
 
+    passwords.login_limiter.reset(user_key)
+    # zmieniony koszt bcrypt - przeliczamy hash, póki znamy hasło
+    if passwords.needs_rehash(user.password):
+        await run_db(db, crud.set_user_password, user, await passwords.hash_password(password))
+
     request.session["user_id"] = user.id
     request.session["user_name"] = user.name
     request.session["role"] = user.role
@@ -210,12 +435,12 @@ def login(request: Request, db: Session = Depends(get_db), name: str = Form(...)
 
 
 @app.get("/leaves/my", response_class=HTMLResponse)
-def get_my_leaves(request: Request, db: Session = Depends(get_db)):
+async def get_my_leaves(request: Request, db: Session = Depends(get_db)):
     user_id = request.session.get("user_id")
     if not user_id:
         return RedirectResponse("/login", status_code=303)
 
-    leaves = db.query(Leave).filter_by(user_id=user_id).all()
+    leaves = await run_db(db, crud.get_user_leaves, user_id)
     return templates.TemplateResponse("my_leaves.html", {"request": request, "leaves": leaves})
 
 @app.post("/logout")
@@ -223,35 +448,113 @@ def logout(request: Request):
     request.session.clear()
     return RedirectResponse(url="/login", status_code=303)
 
-from datetime import timedelta
-
 @app.get("/leaves/calendar", response_class=HTMLResponse)
-def show_calendar(request: Request, db: Session = Depends(get_db)):
+def show_calendar(request: Request):
     if not require_login(request):
         return RedirectResponse("/login", status_code=303)
-    leaves = crud.get_leaves(db)
-
-    adjusted_leaves = []
-    for leave in leaves:
-        adjusted_leave = leave.__dict__.copy()
-        adjusted_leave["owner"] = leave.owner  # bo jest używane w HTML
-        adjusted_leave["date_to"] = leave.date_to + timedelta(days=1)
-        adjusted_leaves.append(adjusted_leave)
-
-    return templates.TemplateResponse("calendar.html", {
-        "request": request,
-        "leaves": adjusted_leaves
-    })
+    # urlopy pobiera sam FullCalendar z /leaves/events, tylko dla widocznego zakresu
+    return templates.TemplateResponse("calendar.html", {"request": request})
+
+def _etag_response(request: Request, body: bytes, media_type: str):
+    # ETag z treści - przeglądarka pyta z If-None-Match i przy niezmienionych danych dostaje 304 bez treści
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+@app.get("/leaves/events")
+async def leave_events(
+    request: Request,
+    start: str = Query(...),
+    end: str = Query(...),
+    db: Session = Depends(get_db)
+):
+    if not request.session.get("user_id"):
+        raise HTTPException(status_code=401, detail="Zaloguj się, aby uzyskać dostęp")
+    # FullCalendar wysyła daty ISO z godziną i strefą, np. 2025-01-27T00:00:00+01:00
+    try:
+        range_start = date.fromisoformat(start[:10])
+        range_end = date.fromisoformat(end[:10])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy zakres dat")
+
+    events = [
+        {
+            "id": leave_id,
+            "title": name,
+            "start": date_from.isoformat(),
+            "end": (date_to + timedelta(days=1)).isoformat(),  # koniec wyłączny w FullCalendar
+            "allDay": True,
+            "color": user_color(user_id)
+        }
+        for leave_id, user_id, date_from, date_to, name in await _cached(db, "leave_events", crud.get_leave_events, range_start, range_end)
+    ]
+    body = json.dumps(events, separators=(",", ":")).encode("utf-8")
+
+    return _etag_response(request, body, "application/json")  # niezmieniony miesiąc nie jest wysyłany ponownie
+
+@app.get("/leaves/heatmap")
+async def leave_heatmap(
+    request: Request,
+    year: int = Query(..., ge=1900, le=9999),
+    format: str = Query("json", pattern="^(json|binary)$"),
+    db: Session = Depends(get_db)
+):
+    # liczba nieobecnych dzień po dniu dla całego roku; binary - uint16 little-endian, jeden na dzień od 1 stycznia
+    if not request.session.get("user_id"):
+        raise HTTPException(status_code=401, detail="Zaloguj się, aby uzyskać dostęp")
+
+    counts = await run_db(db, occupancy.get, year)
+    if format == "binary":
+        body = counts.clip(0, 0xFFFF).astype("<u2").tobytes()
+        media_type = "application/octet-stream"
+    else:
+        body = json.dumps({
+            "year": year,
+            "start": date(year, 1, 1).isoformat(),
+            "max": int(counts.max()),
+            "counts": counts.tolist()
+        }, separators=(",", ":")).encode("utf-8")
+        media_type = "application/json"
+
+    return _etag_response(request, body, media_type)
+
+@app.get("/leaves/absences")
+async def leave_absences(
+    request: Request,
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    db: Session = Depends(get_db)
+):
+    # kto jest na urlopie w zakresie i największa liczba osób nieobecnych jednego dnia
+    if not request.session.get("user_id"):
+        raise HTTPException(status_code=401, detail="Zaloguj się, aby uzyskać dostęp")
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy zakres dat")
+
+    summary = await run_db(db, overlaps.absence_summary, date_from, date_to)
+    return {
+        "date_from": summary["date_from"],
+        "date_to": summary["date_to"],
+        "max_concurrent": summary["max_concurrent"],
+        "peak_day": summary["peak_day"],
+        "absent_on_peak_day": summary["absent_on_peak_day"],
+        "leaves": [
+            {"id": leave_id, "user_id": user_id, "name": name, "date_from": start, "date_to": end}
+            for leave_id, user_id, start, end, name in summary["leaves"]
+        ],
+    }
 
 @app.get("/leaves/edit/{leave_id}", response_class=HTMLResponse)
-def edit_leave_form(
+async def edit_leave_form(
     request: Request,
     leave_id: int,
     db: Session = Depends(get_db)
 ):
     if not require_login(request):
         return RedirectResponse("/login", status_code=303)
-    leave = db.query(Leave).filter_by(id=leave_id).first()
+    leave = await run_db(db, crud.get_leave, leave_id)
     if not leave:
         return HTMLResponse(content="Urlop nie istnieje", status_code=404)
 
@@ -262,7 +565,7 @@ def edit_leave_form(
     })
 
 @app.post("/leaves/edit/{leave_id}")
-def edit_leave_submit(
+async def edit_leave_submit(
     request: Request,
     leave_id: int,
     date_from: str = Form(...),
@@ -270,18 +573,25 @@ def edit_leave_submit(
     comment: str = Form(None),
     db: Session = Depends(get_db)
 ):
-    leave = db.query(Leave).filter_by(id=leave_id).first()
+    leave = await run_db(db, crud.get_leave, leave_id)
     if not leave:
         return HTMLResponse(content="Urlop nie istnieje", status_code=404)
 
-    leave.date_from = date_from
-    leave.date_to = date_to
-    leave.comment = comment
-    db.commit()
+    try:
+        await run_db(db, crud.update_leave, leave, date.fromisoformat(date_from), date.fromisoformat(date_to), comment)
+    except overlaps.LeaveConflictError as e:
+        leave = await run_db(db, crud.get_leave, leave_id)  # po rollbacku obiekt jest wygaszony
+        return templates.TemplateResponse("leave_form.html", {
+            "request": request,
+            "leave": leave,
+            "edit": True,
+            "error": str(e)
+        }, status_code=409)
+    leaves_changed()
     return RedirectResponse(url="/leaves/html", status_code=303)
 
 @app.post("/leaves/delete/{leave_id}")
-def delete_leave_post(
+async def delete_leave_post(
     request: Request,
     leave_id: int,
     db: Session = Depends(get_db)
@@ -289,25 +599,19 @@ def delete_leave_post(
     if request.session.get("role") != "admin":
         return HTMLResponse("Brak uprawnień", status_code=403)
 
-    leave = db.query(Leave).filter_by(id=leave_id).first()
+    leave = await run_db(db, crud.get_leave, leave_id)
     if not leave:
         return HTMLResponse("Urlop nie istnieje", status_code=404)
 
-    db.delete(leave)
-    db.commit()
+    await run_db(db, crud.delete_leave, leave)
+    leaves_changed()
 
     return RedirectResponse(url="/leaves/html", status_code=303)
 
-@app.get("/dashboard", response_class=HTMLResponse)
-def dashboard(request: Request, db: Session = Depends(get_db)):
-    if not require_login(request):
-        return RedirectResponse("/login", status_code=303)
+def _dashboard_data(db: Session, selected_year):
     users = db.query(Userm).order_by(Userm.name).all()
-    leaves = db.query(Leave).all()
-
-    years_in_db = sorted({l.date_from.year for l in leaves} | {l.date_to.year for l in leaves})
+    years_in_db = crud.get_leave_years(db)
     
-    selected_year = request.query_params.get("year")
     try:
         current_year = int(selected_year)
         if current_year not in years_in_db:
@@ -315,30 +619,18 @@ def dashboard(request: Request, db: Session = Depends(get_db)):
     except (TypeError, ValueError):
         current_year = max(years_in_db) if years_in_db else date.today().year
 
-    user_summary = []
-
-    holidays = get_polish_holidays(current_year)
+    if config.DASHBOARD_SUMMARY_MODE == "sql":
+        totals = crud.get_year_summary_sql(db, current_year, date.today())
+    elif config.DASHBOARD_SUMMARY_MODE == "balances":
+        totals = balances.get_year_totals(db, current_year, date.today())
+    else:
+        calendar = workdays.get_calendar(current_year)
+        # jedno przejście po urlopach - grupowanie po użytkowniku i podział na przeszłe/przyszłe z sum prefiksowych
+        totals = summarize_by_user(calendar, crud.get_year_leave_rows(db, current_year), date.today())
 
+    user_summary = []
     for user in users:
-        user_leaves = [l for l in leaves if l.user_id == user.id]
-
-        days_past = 0
-        days_future = 0
-        today = date.today()
-
-        for leave in user_leaves:
-            start = max(leave.date_from, date(current_year, 1, 1))
-            end = min(leave.date_to, date(current_year, 12, 31))
-            if start <= end:
-                current = start
-                while current <= end:
-                    if current.weekday() < 5 and current not in holidays:
-                        if current <= today:
-                            days_past += 1
-                        else:
-                            days_future += 1
-                    current += timedelta(days=1)
-
+        days_past, days_future = totals.get(user.id, (0, 0))
         user_summary.append({
             "name": user.name,
             "email": user.email,
@@ -346,24 +638,35 @@ def dashboard(request: Request, db: Session = Depends(get_db)):
             "days_future": days_future,
             "days_total": days_past + days_future
         })
+    return user_summary, current_year, years_in_db
 
-    return templates.TemplateResponse("dashboard.html", {
-        "request": request,
-        "user_summary": user_summary,
-        "year": current_year,
-        "selected_year": current_year,
-        "years": years_in_db
-    })
+@app.get("/dashboard", response_class=HTMLResponse)
+async def dashboard(request: Request, db: Session = Depends(get_db)):
+    if not require_login(request):
+        return RedirectResponse("/login", status_code=303)
+    selected_year = request.query_params.get("year")
+
+    async def render_dashboard():
+        user_summary, current_year, years_in_db = await run_db(db, _dashboard_data, selected_year)
+        return templates.get_template("_dashboard_table.html").render(
+            user_summary=user_summary,
+            year=current_year,
+            selected_year=current_year,
+            years=years_in_db
+        )
+
+    dashboard_html = await _fragment("dashboard_table", ("leaves", "users"), render_dashboard, year=selected_year)
+    return templates.TemplateResponse("dashboard.html", {"request": request, "dashboard_html": dashboard_html})
 
 @app.get("/my-account", response_class=HTMLResponse)
-def my_account(request: Request, db: Session = Depends(get_db)):
+async def my_account(request: Request, db: Session = Depends(get_db)):
     if not require_login(request):
         return RedirectResponse("/login", status_code=303)
     user_id = request.session.get("user_id")
     if not user_id:
         return RedirectResponse("/login", status_code=303)
     
-    user = db.query(Userm).filter_by(id=user_id).first()
+    user = user_cache.users.get(user_id) or await run_db(db, user_cache.users.load, user_id)
     if not user:
         return HTMLResponse("Użytkownik nie znaleziony", status_code=404)
 
@@ -376,7 +679,7 @@ def change_password_form(request: Request):
     return templates.TemplateResponse("change_password.html", {"request": request})
 
 @app.post("/change-password", response_class=HTMLResponse)
-def change_password_submit(
+async def change_password_submit(
     request: Request,
     old_password: str = Form(...),
     new_password: str = Form(...),
@@ -386,20 +689,23 @@ def change_password_submit(
     if not user_id:
         return RedirectResponse("/login", status_code=303)
 
-    user = db.query(Userm).filter_by(id=user_id).first()
-    if not user or not verify_password(old_password, user.password):
+    throttle_key = f"user-id:{user_id}"
+    if passwords.login_limiter.is_blocked(throttle_key):
+        return templates.TemplateResponse("change_password.html", {
+            "request": request,
+            "error": "Zbyt wiele nieudanych prób. Spróbuj ponownie później"
+        }, status_code=429)
+
+    user = await run_db(db, crud.get_user, user_id)
+    if not user or not await passwords.verify_password(old_password, user.password):
+        passwords.login_limiter.record_failure(throttle_key)
         return templates.TemplateResponse("change_password.html", {
             "request": request,
             "error": "Stare hasło jest nieprawidłowe"
         }, status_code=400)
 
-    user.password = hash_password(new_password)
-    db.commit()
+    passwords.login_limiter.reset(throttle_key)
+    await run_db(db, crud.set_user_password, user, await passwords.hash_password(new_password))
 
     return RedirectResponse("/my-account", status_code=303)
 
-def hash_password(plain_password: str) -> str:
-    return bcrypt.hashpw(plain_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey
+from sqlalchemy import DDL, Column, Integer, String, Date, DateTime, ForeignKey, Index, event, func, literal_column
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -12,6 +13,7 @@ class User(Base):
 
     leaves = relationship("Leave", back_populates="owner")
 
+# w PostgreSQL tabela może być podzielona na partycje roczne po date_from (python partitions.py migrate)
 class Leave(Base):
     __tablename__ = "leaves"
     id = Column(Integer, primary_key=True, index=True)
@@ -20,4 +22,64 @@ class Leave(Base):
     date_to = Column(Date)
     comment = Column(String)
 
-    owner = relationship("User", back_populates="leaves")
\ No newline at end of file
+    owner = relationship("User", back_populates="leaves")
+
+    __table_args__ = (
+        Index("ix_leaves_date_from_date_to", "date_from", "date_to"),  # zapytania o zakres dat (kalendarz)
+        Index("ix_leaves_user_id_date_from", "user_id", "date_from"),  # lista urlopów użytkownika
+        Index("ix_leaves_date_to", "date_to"),  # podział na nadchodzące/minione
+        # tylko PostgreSQL: kto jest na urlopie w zakresie (&&) i zakaz nakładania się urlopów jednej osoby
+        Index(
+            "ix_leaves_period",
+            func.daterange(date_from, date_to, literal_column("'[]'")),
+            postgresql_using="gist",
+        ).ddl_if(dialect="postgresql"),
+        ExcludeConstraint(
+            (user_id, "="),
+            (func.daterange(date_from, date_to, literal_column("'[]'")), "&&"),
+            name="ex_leaves_user_period",
+            using="gist",
+        ).ddl_if(dialect="postgresql"),
+    )
+
+# operator = na kolumnie integer w indeksie GiST wymaga rozszerzenia btree_gist
+event.listen(
+    Leave.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql"),
+)
+
+class Holiday(Base):
+    __tablename__ = "holidays"
+    day = Column(Date, primary_key=True)
+    name = Column(String)
+
+class LeaveBalance(Base):
+    __tablename__ = "leave_balances"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    working_days = Column(Integer, nullable=False, default=0)
+
+class LeaveArchive(Base):
+    # lata przeniesione z leaves do archiwum (python partitions.py archive) - saldo w leave_balances zostaje
+    __tablename__ = "leave_archive"
+    year = Column(Integer, primary_key=True)
+    rows = Column(Integer, nullable=False)
+    location = Column(String, nullable=False)  # schemat.tabela odłączonej partycji albo plik eksportu
+    archived_at = Column(DateTime, nullable=False)
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending / sent / dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    last_error = Column(String)
+    created_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_notification_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
@@ -0,0 +1,79 @@
+# Dzienne obłożenie urlopami - ile osób jest nieobecnych każdego dnia roku (mapa cieplna w kalendarzu)
+# Rok liczony raz z tablicy różnic (+1 w dniu początku, -1 dzień po końcu) i sumy prefiksowej,
+# potem aktualizowany przyrostowo przy każdym zapisie urlopu; po TTL przeładowywany z bazy (zapisy z innych procesów)
+import threading
+import time
+from datetime import date
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Leave
+import config
+import partitions
+
+
+def days_in_year(year: int) -> int:
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+def build_year(year: int, rows) -> np.ndarray:
+    # rows: (date_from, date_to); wynik: liczba urlopów obejmujących każdy dzień roku
+    n = days_in_year(year)
+    if not rows:
+        return np.zeros(n, dtype=np.int32)
+    # numery dni (toordinal) zamiast konwersji obiektów date na datetime64 - wielokrotnie szybciej
+    first = date(year, 1, 1).toordinal()
+    starts = np.fromiter((row[0].toordinal() for row in rows), dtype=np.int64, count=len(rows)) - first
+    ends = np.fromiter((row[1].toordinal() for row in rows), dtype=np.int64, count=len(rows)) - first + 1
+    starts = np.clip(starts, 0, n)
+    ends = np.clip(ends, 0, n)
+    valid = starts < ends
+    diff = np.bincount(starts[valid], minlength=n + 1) - np.bincount(ends[valid], minlength=n + 1)
+    return np.cumsum(diff[:n], dtype=np.int32)
+
+
+def get_year_rows(db: Session, year: int):
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    query = select(Leave.date_from, Leave.date_to).where(partitions.period_overlaps(db, first, last))
+    return db.execute(query).all()
+
+
+class OccupancyCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._years = {}  # rok -> (wczytano_o, tablica)
+        self._generation = 0  # rośnie przy każdej zmianie - przebudowa w trakcie zapisu nie trafia do cache
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, year: int) -> np.ndarray:
+        with self._lock:
+            item = self._years.get(year)
+            if item is not None and time.monotonic() - item[0] < self.ttl:
+                return item[1].copy()
+            generation = self._generation
+        counts = build_year(year, get_year_rows(db, year))
+        with self._lock:
+            if generation == self._generation:
+                self._years[year] = (time.monotonic(), counts)
+        return counts.copy()
+
+    def apply(self, date_from: date, date_to: date, sign: int = 1):
+        # urlop dodany (sign=1) albo usunięty (sign=-1) - zmiana tylko w latach już wczytanych
+        with self._lock:
+            self._generation += 1
+            for year in range(date_from.year, date_to.year + 1):
+                item = self._years.get(year)
+                if item is None:
+                    continue
+                first = date(year, 1, 1)
+                i = max((date_from - first).days, 0)
+                j = min((date_to - first).days + 1, len(item[1]))
+                item[1][i:j] += sign
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._years.clear()
+
+
+occupancy = OccupancyCache(config.OCCUPANCY_TTL_SECONDS)
@@ -0,0 +1,110 @@
+# Kolejka powiadomień e-mail - wiersze zapisywane w tej samej transakcji co urlop, wysyłane w tle
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Leave, NotificationOutbox, User
+import config
+import metrics
+import utils
+
+metrics.describe("notification_outbox_pending", "Liczba powiadomień czekających na wysyłkę")
+metrics.describe("notification_send_seconds", "Czas wysyłki jednego powiadomienia")
+metrics.describe("notification_sent_total", "Wysłane powiadomienia")
+metrics.describe("notification_failed_total", "Nieudane próby wysyłki")
+metrics.describe("notification_dead_total", "Powiadomienia porzucone po wyczerpaniu prób")
+
+
+def enqueue_leave_notification(db: Session, leave: Leave):
+    # bez commita - wiersze trafiają do bazy razem z urlopem
+    employee = db.get(User, leave.user_id)
+    subject, body = utils.build_leave_notification(employee.name, leave.date_from, leave.date_to, leave.comment)
+    now = datetime.now()
+    for (email,) in db.query(User.email).filter_by(role="admin"):
+        db.add(NotificationOutbox(
+            recipient=email, subject=subject, body=body,
+            status="pending", attempts=0, next_attempt_at=now, created_at=now
+        ))
+
+
+def pending_count(db: Session) -> int:
+    return db.query(func.count(NotificationOutbox.id)).filter_by(status="pending").scalar()
+
+
+def _mark_failed(item: NotificationOutbox, error: Exception, now: datetime):
+    item.attempts += 1
+    item.last_error = str(error)
+    if item.attempts >= config.OUTBOX_MAX_ATTEMPTS:
+        item.status = "dead"
+        metrics.inc("notification_dead_total")
+    else:
+        item.next_attempt_at = now + timedelta(seconds=config.OUTBOX_BACKOFF_SECONDS * 2 ** (item.attempts - 1))
+    metrics.inc("notification_failed_total")
+
+
+def drain(db: Session, batch_size: int = None) -> int:
+    # wysyła jedną partię zaległych powiadomień przez jedno połączenie SMTP; zwraca liczbę przetworzonych
+    now = datetime.now()
+    batch = (
+        db.query(NotificationOutbox)
+        .filter(NotificationOutbox.status == "pending", NotificationOutbox.next_attempt_at <= now)
+        .order_by(NotificationOutbox.id)
+        .limit(batch_size or config.OUTBOX_BATCH_SIZE)
+        .with_for_update(skip_locked=True)  # kilka workerów nie weźmie tych samych wierszy (PostgreSQL)
+        .all()
+    )
+    if not batch:
+        return 0
+
+    try:
+        server = utils.open_smtp_connection()
+    except Exception as e:
+        for item in batch:
+            _mark_failed(item, e, now)
+        db.commit()
+        return len(batch)
+
+    with server:
+        for item in batch:
+            started = time.perf_counter()
+            try:
+                server.sendmail(utils.EMAIL_SENDER, item.recipient, utils.build_message(item.recipient, item.subject, item.body))
+            except Exception as e:
+                _mark_failed(item, e, now)
+                continue
+            metrics.observe("notification_send_seconds", time.perf_counter() - started)
+            metrics.inc("notification_sent_total")
+            item.status = "sent"
+            item.sent_at = datetime.now()
+            item.last_error = None
+    db.commit()
+    return len(batch)
+
+
+class OutboxWorker(threading.Thread):
+    def __init__(self, session_factory, poll_seconds: float = None):
+        super().__init__(name="notification-outbox", daemon=True)
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds or config.OUTBOX_POLL_SECONDS
+        self._stop_event = threading.Event()
+
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        self.join(timeout)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            processed = 0
+            db = self.session_factory()
+            try:
+                processed = drain(db)
+                metrics.set_gauge("notification_outbox_pending", pending_count(db))
+            except Exception as e:
+                db.rollback()
+                print(f"Błąd kolejki powiadomień: {e}")
+            finally:
+                db.close()
+            # pełna partia - od razu następna, w przeciwnym razie czekamy
+            if processed < config.OUTBOX_BATCH_SIZE:
+                self._stop_event.wait(self.poll_seconds)
@@ -0,0 +1,295 @@
+# Wykrywanie nakładających się urlopów i liczba równoczesnych nieobecności
+# PostgreSQL: indeks GiST na daterange(date_from, date_to) i ograniczenie EXCLUDE (jeden użytkownik
+# nie może mieć dwóch nakładających się urlopów); SQLite i inne: drzewo przedziałów w pamięci
+# Uruchomienie z linii poleceń (istniejąca baza PostgreSQL):
+#   python overlaps.py conflicts   (lista nakładających się urlopów, które trzeba poprawić)
+#   python overlaps.py install     (rozszerzenie btree_gist, indeks i ograniczenie)
+import threading
+import time
+from datetime import date, timedelta
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from models import Leave, User
+import config
+import partitions
+import user_cache
+
+
+class LeaveConflictError(ValueError):
+    # conflicts: lista (id, date_from, date_to) urlopów, na które nachodzi nowy zakres
+    def __init__(self, message: str, conflicts=()):
+        super().__init__(message)
+        self.conflicts = list(conflicts)
+
+
+def leave_period(date_from, date_to):
+    # ta sama postać wyrażenia co w indeksie GiST i ograniczeniu EXCLUDE (models.Leave), żeby planer ich użył
+    return func.daterange(date_from, date_to, literal_column("'[]'"))
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def is_exclusion_violation(error: IntegrityError) -> bool:
+    # 23P01 - naruszenie ograniczenia EXCLUDE (psycopg2: pgcode, asyncpg: sqlstate)
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    return code == "23P01"
+
+
+class IntervalTree:
+    # statyczne drzewo przedziałów na posortowanej tablicy: węzeł to środek zakresu [lo, hi),
+    # max_end[węzeł] - największy koniec w jego poddrzewie; zapytanie O(log n + liczba wyników)
+    def __init__(self, items):
+        # items: (date_from, date_to, payload)
+        items = sorted(items, key=lambda item: item[0])
+        self.starts = [item[0] for item in items]
+        self.ends = [item[1] for item in items]
+        self.payloads = [item[2] for item in items]
+        self.max_end = list(self.ends)
+        self._build(0, len(items))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        best = self.ends[mid]
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None and child > best:
+                best = child
+        self.max_end[mid] = best
+        return best
+
+    def overlapping(self, start, end):
+        # payloady przedziałów nachodzących na [start, end]
+        result = []
+        stack = [(0, len(self.starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] < start:
+                continue  # całe poddrzewo kończy się przed zakresem
+            stack.append((lo, mid))
+            if self.starts[mid] <= end:
+                if self.ends[mid] >= start:
+                    result.append(self.payloads[mid])
+                stack.append((mid + 1, hi))
+        return result
+
+
+class LeaveIntervalIndex:
+    # drzewo wszystkich urlopów w pamięci procesu (dla baz bez daterange); budowane leniwie, po TTL przeładowywane
+    # (zapisy z innych procesów); zapisy tego procesu trafiają do małego bufora zmian (dodane, usunięte/zastąpione),
+    # drzewo przebudowywane w pamięci dopiero, gdy bufor urośnie do ~pierwiastka z liczby urlopów
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._tree = None
+        self._loaded_at = 0.0
+        self._added = {}  # id -> wiersz urlopu zapisanego po zbudowaniu drzewa
+        self._removed = set()  # id urlopów z drzewa, które usunięto albo zmieniono
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._tree = None
+            self._writes += 1
+
+    def _load(self, db: Session) -> IntervalTree:
+        query = select(Leave.id, Leave.user_id, Leave.date_from, Leave.date_to, User.name).join(User, Leave.owner)
+        return IntervalTree((row.date_from, row.date_to, tuple(row)) for row in db.execute(query))
+
+    def overlapping(self, db: Session, start: date, end: date):
+        # (id, user_id, date_from, date_to, name) urlopów nachodzących na [start, end]
+        with self._lock:
+            tree = self._tree
+            if tree is not None and time.monotonic() - self._loaded_at < self.ttl:
+                removed, added = set(self._removed), list(self._added.values())
+            else:
+                tree = None
+                writes = self._writes
+        if tree is None:
+            tree = self._load(db)
+            with self._lock:
+                # zapis w trakcie wczytywania mógł się w drzewie nie znaleźć - następne zapytanie wczyta je od nowa
+                self._tree = tree
+                self._loaded_at = time.monotonic() if self._writes == writes else 0.0
+                self._added, self._removed = {}, set()
+            removed, added = set(), []
+        rows = [row for row in tree.overlapping(start, end) if row[0] not in removed]
+        rows.extend(row for row in added if row[2] <= end and row[3] >= start)
+        return rows
+
+    def add(self, db: Session, leaves):
+        # leaves: (id, user_id, date_from, date_to) zapisanych (nowych albo zmienionych) urlopów, po commicie
+        if self._tree is None:
+            return
+        rows = [(leave_id, user_id, date_from, date_to, user_cache.users.load(db, user_id).name)
+                for leave_id, user_id, date_from, date_to in leaves]
+        with self._lock:
+            self._writes += 1
+            if self._tree is None:
+                return
+            for row in rows:
+                self._removed.add(row[0])  # poprzednia wersja z drzewa, jeśli była
+                self._added[row[0]] = row
+            self._compact()
+
+    def remove(self, leave_ids):
+        with self._lock:
+            self._writes += 1
+            if self._tree is None:
+                return
+            for leave_id in leave_ids:
+                self._added.pop(leave_id, None)
+                self._removed.add(leave_id)
+            self._compact()
+
+    def _compact(self):
+        # przebudowa drzewa z pamięci (bez zapytania) - zapytania przeglądają bufor liniowo, więc musi być mały
+        if len(self._added) + len(self._removed) <= max(64, int(len(self._tree) ** 0.5)):
+            return
+        rows = [row for row in self._tree.payloads if row[0] not in self._removed]
+        rows.extend(self._added.values())
+        self._tree = IntervalTree((row[2], row[3], row) for row in rows)
+        self._added, self._removed = {}, set()
+
+
+leave_index = LeaveIntervalIndex(ttl=config.OVERLAP_INDEX_TTL_SECONDS)
+
+
+def find_user_conflicts(db: Session, user_id: int, date_from: date, date_to: date, exclude_id: int = None):
+    # urlopy użytkownika nachodzące na [date_from, date_to] - indeks GiST (PostgreSQL) lub (user_id, date_from);
+    # period_overlaps także w PostgreSQL - przy partycjach zawęża ich listę, && wybiera indeks GiST
+    query = select(Leave.id, Leave.date_from, Leave.date_to).where(
+        Leave.user_id == user_id, partitions.period_overlaps(db, date_from, date_to)
+    )
+    if _is_postgres(db):
+        query = query.where(leave_period(Leave.date_from, Leave.date_to).op("&&")(leave_period(date_from, date_to)))
+    if exclude_id is not None:
+        query = query.where(Leave.id != exclude_id)
+    return db.execute(query.order_by(Leave.date_from)).all()
+
+
+def validate_leave(db: Session, user_id: int, date_from: date, date_to: date, exclude_id: int = None):
+    if date_to < date_from:
+        raise LeaveConflictError("Data końcowa jest wcześniejsza niż początkowa")
+    if date_to > date_from + partitions.MAX_LEAVE_SPAN:
+        # limit długości daje dolną granicę date_from w zapytaniach o zakres (partitions.period_overlaps)
+        raise LeaveConflictError(f"Urlop nie może być dłuższy niż {config.MAX_LEAVE_DAYS} dni")
+    conflicts = find_user_conflicts(db, user_id, date_from, date_to, exclude_id)
+    if conflicts:
+        days = ", ".join(f"{c.date_from} - {c.date_to}" for c in conflicts)
+        raise LeaveConflictError(f"Urlop nakłada się na istniejący: {days}", conflicts)
+
+
+def who_is_off(db: Session, start: date, end: date):
+    # (id, user_id, date_from, date_to, name) urlopów nachodzących na [start, end]
+    if _is_postgres(db):
+        query = (
+            select(Leave.id, Leave.user_id, Leave.date_from, Leave.date_to, User.name)
+            .join(User, Leave.owner)
+            .where(
+                partitions.period_overlaps(db, start, end),
+                leave_period(Leave.date_from, Leave.date_to).op("&&")(leave_period(start, end)),
+            )
+            .order_by(Leave.date_from, Leave.id)
+        )
+        return [tuple(row) for row in db.execute(query)]
+    return sorted(leave_index.overlapping(db, start, end), key=lambda row: (row[2], row[0]))
+
+
+def max_concurrent(rows, start: date, end: date):
+    # zamiatanie: +1 w dniu początku, -1 dzień po końcu (zakresy przycięte do [start, end]);
+    # wynik: (największa liczba nieobecnych jednocześnie, pierwszy dzień z tą liczbą)
+    deltas = {}
+    for row in rows:
+        first = max(row[2], start)
+        last = min(row[3], end)
+        if first > last:
+            continue
+        deltas[first] = deltas.get(first, 0) + 1
+        after = last + timedelta(days=1)
+        deltas[after] = deltas.get(after, 0) - 1
+
+    best, best_day, current = 0, None, 0
+    for day in sorted(deltas):
+        current += deltas[day]
+        if current > best:
+            best, best_day = current, day
+    return best, best_day
+
+
+def absence_summary(db: Session, start: date, end: date):
+    rows = who_is_off(db, start, end)
+    peak, peak_day = max_concurrent(rows, start, end)
+    return {
+        "date_from": start,
+        "date_to": end,
+        "max_concurrent": peak,
+        "peak_day": peak_day,
+        "absent_on_peak_day": sorted({row[4] for row in rows if peak_day and row[2] <= peak_day <= row[3]}),
+        "leaves": rows,
+    }
+
+
+def find_all_conflicts(db: Session):
+    # pary nakładających się urlopów tego samego użytkownika (przed założeniem ograniczenia EXCLUDE)
+    other = aliased(Leave)
+    query = (
+        select(Leave.id, other.id, Leave.user_id, Leave.date_from, Leave.date_to, other.date_from, other.date_to)
+        .join(other, (other.user_id == Leave.user_id) & (other.id > Leave.id))
+        .where(other.date_from <= Leave.date_to, other.date_to >= Leave.date_from)
+        .order_by(Leave.user_id, Leave.date_from)
+    )
+    return db.execute(query).all()
+
+
+def install_postgres_constraints(db: Session):
+    # dla baz utworzonych przed dodaniem indeksu - create_all nie zmienia istniejących tabel;
+    # tabela podzielona na partycje (partitions.py migrate) ma już indeks i ograniczenia w każdej partycji
+    if partitions.is_partitioned(db):
+        return
+    db.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+    db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_leaves_period ON leaves USING gist (daterange(date_from, date_to, '[]'))"
+    ))
+    exists = db.execute(text("SELECT 1 FROM pg_constraint WHERE conname = 'ex_leaves_user_period'")).first()
+    if not exists:
+        db.execute(text(
+            "ALTER TABLE leaves ADD CONSTRAINT ex_leaves_user_period "
+            "EXCLUDE USING gist (user_id WITH =, daterange(date_from, date_to, '[]') WITH &&)"
+        ))
+    db.commit()
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Nakładające się urlopy")
+    parser.add_argument("command", choices=["conflicts", "install"])
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        conflicts = find_all_conflicts(db)
+        for first_id, second_id, user_id, from_1, to_1, from_2, to_2 in conflicts:
+            print(f"użytkownik {user_id}: urlop {first_id} ({from_1} - {to_1}) i {second_id} ({from_2} - {to_2})")
+        if args.command == "conflicts":
+            print(f"Nakładające się pary: {len(conflicts)}")
+        elif conflicts:
+            raise SystemExit("Najpierw popraw nakładające się urlopy")
+        elif not _is_postgres(db):
+            print("Ograniczenie EXCLUDE jest dostępne tylko w PostgreSQL - w tej bazie działa drzewo przedziałów")
+        else:
+            install_postgres_constraints(db)
+            print("Indeks GiST i ograniczenie EXCLUDE założone")
+    finally:
+        db.close()
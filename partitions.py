@@ -0,0 +1,286 @@
+# Partycje roczne tabeli leaves (PostgreSQL: PARTITION BY RANGE (date_from)) i archiwizacja zamkniętych lat
+# W tabeli z partycjami zapytania o zakres dat ograniczają date_from z obu stron (period_overlaps) - planer
+# czyta tylko partycje potrzebnych lat; w SQLite i bez partycji to zwykły warunek na zakres
+# Uruchomienie z linii poleceń:
+#   python partitions.py migrate    (istniejąca tabela leaves -> partycjonowana, w jednej transakcji)
+#   python partitions.py ensure     (partycje na bieżący i kolejne lata - np. raz w roku z crona)
+#   python partitions.py list
+#   python partitions.py archive 2019 --export archiwum/urlopy_2019.csv.gz
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, delete, func, select, text
+from sqlalchemy.orm import Session
+from models import Leave, LeaveArchive
+import config
+
+# date_to - date_from najdłuższego dozwolonego urlopu (overlaps.validate_leave)
+MAX_LEAVE_SPAN = timedelta(days=config.MAX_LEAVE_DAYS - 1)
+
+
+def year_bounds(year: int):
+    # zakres partycji: [1 stycznia, 1 stycznia następnego roku)
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def lower_bound(day: date):
+    # urlop trwający w dniu day zaczął się najwcześniej MAX_LEAVE_SPAN wcześniej - warunek nie zmienia wyniku,
+    # o ile w tabeli nie ma dłuższych urlopów (sprawdza migrate, przy zapisie overlaps.validate_leave)
+    return Leave.date_from >= day - MAX_LEAVE_SPAN
+
+
+def ends_on_or_after(db: Session, day: date):
+    # urlopy trwające jeszcze w dniu day; w tabeli z partycjami z dolną granicą date_from, żeby planer
+    # pominął partycje lat, które skończyły się przed day (bez partycji granica nic nie daje,
+    # a starsze urlopy dłuższe niż MAX_LEAVE_DAYS by znikały)
+    if uses_partitions(db):
+        return and_(Leave.date_to >= day, lower_bound(day))
+    return Leave.date_to >= day
+
+
+def period_overlaps(db: Session, start: date, end: date):
+    # urlopy nachodzące na [start, end]
+    return and_(Leave.date_from <= end, ends_on_or_after(db, start))
+
+
+def starts_in_year(year: int):
+    # dokładnie wiersze jednej partycji
+    first, after = year_bounds(year)
+    return and_(Leave.date_from >= first, Leave.date_from < after)
+
+
+def partition_name(year: int) -> str:
+    return f"leaves_y{year}"
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _quote(db: Session, name: str) -> str:
+    return db.get_bind().dialect.identifier_preparer.quote(name)
+
+
+def is_partitioned(db: Session) -> bool:
+    if not _is_postgres(db):
+        return False
+    kind = db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('leaves')")).scalar()
+    return kind == "p"
+
+
+_partitioned = {}  # silnik -> czy leaves ma partycje; po migrate aplikację trzeba zrestartować
+
+
+def uses_partitions(db: Session) -> bool:
+    bind = db.get_bind()
+    if bind not in _partitioned:
+        _partitioned[bind] = is_partitioned(db)
+    return _partitioned[bind]
+
+
+def list_partitions(db: Session):
+    # [(rok, nazwa)] partycji lat; partycja domyślna (leaves_default) pominięta
+    rows = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('leaves') ORDER BY c.relname"
+    ))
+    prefix = partition_name(0)[:-1]
+    return [(int(name[len(prefix):]), name) for (name,) in rows if name.startswith(prefix)]
+
+
+def create_partition(db: Session, year: int) -> bool:
+    # False, jeśli partycja już jest; wiersze tego roku z partycji domyślnej przenoszone do nowej
+    # (ATTACH nie przejdzie, dopóki partycja domyślna ma wiersze z zakresu)
+    if year in dict(list_partitions(db)):
+        return False
+    name = partition_name(year)
+    first, after = year_bounds(year)
+    db.execute(text(f"CREATE TABLE {name} (LIKE leaves INCLUDING DEFAULTS)"))
+    db.execute(text(
+        f"WITH moved AS (DELETE FROM leaves_default WHERE date_from >= :first AND date_from < :after "
+        f"RETURNING id, user_id, date_from, date_to, comment) "
+        f"INSERT INTO {name} (id, user_id, date_from, date_to, comment) SELECT * FROM moved"
+    ), {"first": first, "after": after})
+    db.execute(text(f"ALTER TABLE leaves ATTACH PARTITION {name} FOR VALUES FROM ('{first}') TO ('{after}')"))
+    # EXCLUDE nie da się założyć na tabeli partycjonowanej - każda partycja ma własne; urlopy jednej osoby
+    # z różnych lat sprawdza overlaps.validate_leave
+    db.execute(text(
+        f"ALTER TABLE {name} ADD CONSTRAINT ex_{name}_user_period "
+        f"EXCLUDE USING gist (user_id WITH =, daterange(date_from, date_to, '[]') WITH &&)"
+    ))
+    return True
+
+
+def ensure_partitions(db: Session, today: date = None):
+    # partycje na bieżący rok i PARTITION_YEARS_AHEAD kolejnych; zwraca lata nowo założonych
+    this_year = (today or date.today()).year
+    created = [
+        year for year in range(this_year, this_year + config.PARTITION_YEARS_AHEAD + 1)
+        if create_partition(db, year)
+    ]
+    db.commit()
+    return created
+
+
+def check_rows(db: Session):
+    # wiersze, które nie zmieszczą się w tabeli partycjonowanej albo złamią dolną granicę date_from
+    query = select(Leave.id, Leave.date_from, Leave.date_to).where(
+        Leave.date_from.is_(None) | Leave.date_to.is_(None) | (Leave.date_to > Leave.date_from + MAX_LEAVE_SPAN)
+    )
+    return db.execute(query.order_by(Leave.id)).all()
+
+
+def migrate(db: Session, today: date = None) -> bool:
+    # przepisanie istniejącej tabeli do partycjonowanej; False, jeśli już jest partycjonowana
+    if is_partitioned(db):
+        return False
+    this_year = (today or date.today()).year
+    first_year, last_year = db.execute(
+        select(func.min(Leave.date_from), func.max(Leave.date_from))
+    ).one()
+    years = range(
+        min(first_year.year if first_year else this_year, this_year),
+        max(last_year.year if last_year else this_year, this_year + config.PARTITION_YEARS_AHEAD) + 1,
+    )
+
+    sequence = db.execute(text("SELECT pg_get_serial_sequence('leaves', 'id')")).scalar()
+    db.execute(text("LOCK TABLE leaves IN ACCESS EXCLUSIVE MODE"))
+    db.execute(text("ALTER TABLE leaves RENAME TO leaves_unpartitioned"))
+    # nazwy indeksów są wspólne dla schematu - stare dostają przyrostek, nowa tabela przejmuje oryginalne
+    old_indexes = db.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'leaves_unpartitioned'"
+    )).scalars().all()
+    for index in old_indexes:
+        db.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index[:55]}_old"'))
+
+    # klucz główny tabeli partycjonowanej musi zawierać klucz partycji
+    db.execute(text(
+        f"CREATE TABLE leaves ("
+        f"id integer NOT NULL DEFAULT nextval('{sequence}'), "
+        f"user_id integer REFERENCES users (id), "
+        f"date_from date NOT NULL, "
+        f"date_to date NOT NULL, "
+        f"comment varchar, "
+        f"CONSTRAINT leaves_pkey PRIMARY KEY (id, date_from)"
+        f") PARTITION BY RANGE (date_from)"
+    ))
+    db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY leaves.id"))
+    db.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+    connection = db.connection()
+    for index in Leave.__table__.indexes:  # te same indeksy co w models.Leave, zakładane na każdej partycji
+        index.create(connection)
+    db.execute(text("CREATE TABLE leaves_default PARTITION OF leaves DEFAULT"))
+    for year in years:
+        create_partition(db, year)
+
+    db.execute(text(
+        "INSERT INTO leaves (id, user_id, date_from, date_to, comment) "
+        "SELECT id, user_id, date_from, date_to, comment FROM leaves_unpartitioned"
+    ))
+    db.execute(text("DROP TABLE leaves_unpartitioned"))
+    db.commit()
+    db.execute(text("ANALYZE leaves"))
+    db.commit()
+    _partitioned.clear()
+    return True
+
+
+def archived_years(db: Session):
+    return set(db.execute(select(LeaveArchive.year)).scalars())
+
+
+def check_archivable(db: Session, year: int, today: date = None):
+    # ValueError, jeśli rok jest jeszcze otwarty albo jego urlopy sięgają lat, które nie są w archiwum -
+    # dni tych lat są w leave_balances, a po usunięciu urlopów pełne przeliczenie sald by ich nie widziało
+    first_open = (today or date.today()).year - config.ARCHIVE_KEEP_YEARS + 1
+    if year >= first_open:
+        raise ValueError(f"Rok {year} jest jeszcze otwarty - archiwizować można lata do {first_open - 1}")
+    archived = archived_years(db)
+    if year in archived:
+        raise ValueError(f"Rok {year} jest już w archiwum")
+    last_day = db.execute(select(func.max(Leave.date_to)).where(starts_in_year(year))).scalar()
+    if last_day is not None and last_day >= date(first_open, 1, 1):
+        raise ValueError(f"Urlopy z {year} trwają do {last_day} - rok {last_day.year} zostaje w bazie")
+    missing = [later for later in range(year + 1, last_day.year + 1) if later not in archived] if last_day else []
+    if missing:
+        raise ValueError(
+            f"Urlopy z {year} trwają do {last_day} - najpierw zarchiwizuj rok {', '.join(map(str, missing))}"
+        )
+
+
+def archive_year(db: Session, year: int, export_path: str = None, today: date = None):
+    # PostgreSQL z partycjami: partycja odłączona i przeniesiona do ARCHIVE_SCHEMA (dane zostają w bazie,
+    # poza planem zapytań); bez partycji (SQLite): wiersze usuwane, archiwum to plik z eksportu
+    check_archivable(db, year, today)
+    rows = db.execute(select(func.count()).select_from(Leave).where(starts_in_year(year))).scalar()
+
+    if is_partitioned(db) and year in dict(list_partitions(db)):
+        name = partition_name(year)
+        schema = _quote(db, config.ARCHIVE_SCHEMA)
+        db.execute(text(f"ALTER TABLE leaves DETACH PARTITION {name}"))
+        db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+        db.execute(text(f"ALTER TABLE {name} SET SCHEMA {schema}"))
+        if config.ARCHIVE_TABLESPACE:
+            db.execute(text(f"ALTER TABLE {schema}.{name} SET TABLESPACE {_quote(db, config.ARCHIVE_TABLESPACE)}"))
+        location = f"{config.ARCHIVE_SCHEMA}.{name}"
+    elif export_path:
+        db.execute(delete(Leave).where(starts_in_year(year)))
+        location = export_path
+    else:
+        raise ValueError("Tabela leaves nie ma partycji - podaj --export, archiwum będzie plikiem")
+
+    db.add(LeaveArchive(year=year, rows=rows, location=location, archived_at=datetime.now()))
+    db.commit()
+    return rows, location
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Partycje roczne i archiwum urlopów")
+    parser.add_argument("command", choices=["migrate", "ensure", "list", "archive"])
+    parser.add_argument("year", nargs="?", type=int, help="rok do archiwizacji")
+    parser.add_argument("--export", help="archive: najpierw zapisz urlopy roku do pliku (.csv, .jsonl, opcjonalnie .gz)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command in ("migrate", "ensure") and not _is_postgres(db):
+            raise SystemExit("Partycje są dostępne tylko w PostgreSQL - w tej bazie zapytania działają bez nich")
+        if args.command == "migrate":
+            invalid = check_rows(db)
+            for leave_id, date_from, date_to in invalid:
+                print(f"urlop {leave_id}: {date_from} - {date_to}")
+            if invalid:
+                raise SystemExit(f"Najpierw popraw urlopy bez dat albo dłuższe niż {config.MAX_LEAVE_DAYS} dni")
+            print("Tabela leaves podzielona na partycje" if migrate(db) else "Tabela leaves ma już partycje")
+        elif args.command == "ensure":
+            if not is_partitioned(db):
+                raise SystemExit("Najpierw: python partitions.py migrate")
+            created = ensure_partitions(db)
+            print(f"Nowe partycje: {', '.join(map(str, created)) or 'brak'}")
+        elif args.command == "list":
+            if is_partitioned(db):
+                for year, name in list_partitions(db):
+                    count = db.execute(select(func.count()).select_from(Leave).where(starts_in_year(year))).scalar()
+                    print(f"{name}: {count}")
+            for item in db.execute(select(LeaveArchive).order_by(LeaveArchive.year)).scalars():
+                print(f"archiwum {item.year}: {item.rows} urlopów, {item.location} ({item.archived_at:%Y-%m-%d})")
+        else:
+            if args.year is None:
+                parser.error("archive wymaga roku")
+            try:
+                check_archivable(db, args.year)
+            except ValueError as e:
+                raise SystemExit(str(e))
+            if args.export:
+                import bulk
+                bulk.export_file(SessionLocal, args.export, year=args.year)
+            try:
+                rows, location = archive_year(db, args.year, args.export)
+            except ValueError as e:
+                raise SystemExit(str(e))
+            from response_cache import cache
+            cache.bump("leaves")  # wspólne wersje (STATE_BACKEND=redis) - workery przestają serwować stare widoki
+            print(f"Zarchiwizowano {rows} urlopów z {args.year}: {location}")
+    finally:
+        db.close()
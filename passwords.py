@@ -0,0 +1,130 @@
+# Hashowanie haseł (bcrypt) w osobnej, ograniczonej puli oraz limit nieudanych logowań
+import asyncio
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import bcrypt
+import config
+import state
+
+
+def _hash(plain_password: str, rounds: int) -> str:
+    return bcrypt.hashpw(plain_password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except (ValueError, AttributeError):
+        return False  # brak hasła albo wartość, która nie jest hashem bcrypt
+
+
+# bcrypt zwalnia GIL, więc zwykle wystarczy pula wątków; liczba workerów = maks. liczba równoległych hashy
+_executor_class = ProcessPoolExecutor if config.PASSWORD_HASH_POOL == "process" else ThreadPoolExecutor
+# pula tworzona przy pierwszym użyciu - nie w procesie głównym gunicorna (preload_app), bo workery po fork
+# dziedziczyłyby kolejki tej samej puli procesów i czekały na wynik w nieskończoność
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = _executor_class(max_workers=config.PASSWORD_HASH_WORKERS)
+    return _executor
+
+
+def reset_after_fork():
+    # gunicorn.conf.py post_fork - pula odziedziczona z procesu głównego (jeśli już powstała) jest porzucana,
+    # worker założy własną
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+async def hash_password(plain_password: str) -> str:
+    return await asyncio.wrap_future(_get_executor().submit(_hash, plain_password, config.BCRYPT_ROUNDS))
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.wrap_future(_get_executor().submit(_check, plain_password, hashed_password))
+
+
+def hash_password_sync(plain_password: str) -> str:
+    # dla kodu synchronicznego (crud, skrypty) - ta sama pula i ten sam koszt
+    return _get_executor().submit(_hash, plain_password, config.BCRYPT_ROUNDS).result()
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    # hash w formacie $2b$12$... - przeliczamy, gdy koszt różni się od BCRYPT_ROUNDS
+    try:
+        return int(hashed_password.split("$")[2]) != config.BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return True
+
+
+class FailedLoginLimiter:
+    # maks. max_failures nieudanych prób w oknie window_seconds na klucz (użytkownik / adres IP)
+    def __init__(self, max_failures: int, window_seconds: float):
+        self.max_failures = max_failures
+        self.window_seconds = window_seconds
+        self._failures = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def _prune(self, key, now):
+        failures = self._failures[key]
+        while failures and failures[0] <= now - self.window_seconds:
+            failures.popleft()
+        if not failures:
+            del self._failures[key]
+        return failures
+
+    def is_blocked(self, *keys) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return any(len(self._prune(key, now)) >= self.max_failures for key in keys)
+
+    def record_failure(self, *keys):
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._failures[key].append(now)
+
+    def reset(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._failures.pop(key, None)
+
+
+class SharedLoginLimiter:
+    # ten sam interfejs na wspólnym stanie (state.client) - limit obowiązuje we wszystkich workerach;
+    # okno stałe: licznik nieudanych prób wygasa window_seconds po pierwszej z nich
+    def __init__(self, client, max_failures: int, window_seconds: float, prefix: str = "urlopy:login-failures:"):
+        self.client = client
+        self.max_failures = max_failures
+        self.window_seconds = window_seconds
+        self.prefix = prefix
+
+    def is_blocked(self, *keys) -> bool:
+        return any(int(self.client.get(self.prefix + key) or 0) >= self.max_failures for key in keys)
+
+    def record_failure(self, *keys):
+        for key in keys:
+            if self.client.incr(self.prefix + key) == 1:
+                self.client.expire(self.prefix + key, int(self.window_seconds))
+
+    def reset(self, *keys):
+        self.client.delete(*(self.prefix + key for key in keys))
+
+
+def _limiter(max_failures: int):
+    if state.client is not None:
+        return SharedLoginLimiter(state.client, max_failures, config.LOGIN_FAILURE_WINDOW_SECONDS)
+    return FailedLoginLimiter(max_failures, config.LOGIN_FAILURE_WINDOW_SECONDS)
+
+
+login_limiter = _limiter(config.LOGIN_MAX_FAILURES)  # na użytkownika, zerowany po udanym logowaniu
+ip_login_limiter = _limiter(config.LOGIN_MAX_FAILURES_PER_IP)  # na adres IP, niezerowany
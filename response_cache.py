@@ -0,0 +1,108 @@
+# Pamięć podręczna wyników widoków (dashboard, lista urlopów, wydarzenia kalendarza)
+# Klucz = widok + filtry + wersje tabel; każdy zapis urlopu/użytkownika podbija wersję (bump),
+# więc stare wpisy przestają być trafiane i same wygasają (LRU / TTL)
+# CACHE_BACKEND: "memory" (LRU w procesie), "redis" (wspólny dla wielu procesów), "none";
+# wersje tabel trzyma state.versions - przy STATE_BACKEND=redis wspólne dla wszystkich workerów
+import pickle
+import threading
+import time
+from collections import OrderedDict
+import config
+import metrics
+import state
+
+metrics.describe("response_cache_requests_total", "Odczyty z pamięci podręcznej widoków (result=hit/miss)")
+
+
+class MemoryBackend:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()  # klucz -> (wygasa_o, wartość), kolejność LRU
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class RedisBackend:
+    # wartości serializowane pickle
+    def __init__(self, client, prefix: str = "urlopy:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl: float):
+        self.client.set(self.prefix + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=max(int(ttl), 1))
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    def key(self, view: str, tables, **params) -> str:
+        versions = ",".join(f"{table}={state.versions.get(table)}" for table in tables)
+        filters = ",".join(f"{name}={params[name]}" for name in sorted(params))
+        return f"{view}|{versions}|{filters}"
+
+    def get(self, view: str, key: str):
+        value = self.backend.get(key)
+        metrics.inc("response_cache_requests_total", view=view, result="miss" if value is None else "hit")
+        return value
+
+    def set(self, key: str, value):
+        self.backend.set(key, value, self.ttl)
+
+    def bump(self, *tables):
+        # wywoływane po każdym zapisie - nowe wersje w kluczach, stare wpisy nieosiągalne
+        for table in tables:
+            state.versions.bump(table)
+
+
+class NullCache(ResponseCache):
+    # CACHE_BACKEND=none - zawsze liczymy od nowa
+    def __init__(self):
+        super().__init__(MemoryBackend(0), 0)
+
+    def get(self, view: str, key: str):
+        return None
+
+    def set(self, key: str, value):
+        pass
+
+
+def create_cache():
+    if config.CACHE_BACKEND == "none":
+        return NullCache()
+    if config.CACHE_BACKEND == "redis":
+        # ten sam adres co stan współdzielony - jedno połączenie
+        same = state.client is not None and config.CACHE_REDIS_URL == config.STATE_REDIS_URL
+        client = state.client if same else state.connect(config.CACHE_REDIS_URL)
+        return ResponseCache(RedisBackend(client), config.CACHE_TTL_SECONDS)
+    return ResponseCache(MemoryBackend(config.CACHE_SIZE), config.CACHE_TTL_SECONDS)
+
+
+cache = create_cache()
@@ -0,0 +1,163 @@
+# Stan współdzielony przez procesy (workery gunicorn/uvicorn): liczniki wersji tabel, limity logowań,
+# pamięć podręczna widoków. STATE_BACKEND: "memory" (jeden proces) albo "redis" (wspólny dla workerów)
+# STATE_REDIS_URL: redis://... (serwer Redis), sqlite:///ścieżka (zamiennik na jednym hoście, bez serwera)
+# albo fake (klient w pamięci procesu - lokalnie i w testach ręcznych, nie dzieli stanu między procesami)
+import sqlite3
+import threading
+import time
+import config
+
+
+class FakeRedis:
+    # zastępuje klienta redis w obrębie jednego procesu
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] < time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._alive(key)
+            return None if item is None else item[0]
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def incr(self, key):
+        with self._lock:
+            item = self._alive(key)
+            value = int(item[0]) + 1 if item else 1
+            self._data[key] = (str(value).encode(), item[1] if item else None)
+            return value
+
+    def expire(self, key, seconds):
+        with self._lock:
+            item = self._alive(key)
+            if item is not None:
+                self._data[key] = (item[0], time.monotonic() + seconds)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SqliteRedis:
+    # podzbiór poleceń Redis na pliku SQLite (WAL) - wspólny dla wszystkich procesów na jednym hoście;
+    # wygasłe klucze usuwane przy zapisie, najwyżej raz na purge_interval sekund
+    def __init__(self, path: str, purge_interval: float = 60):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._purged_at = 0.0
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_kv_expires_at ON kv (expires_at)")
+
+    def reset_after_fork(self):
+        # połączenia SQLite nie wolno używać po fork() - worker otwiera własne (gunicorn.conf.py post_fork)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ex if ex else None),
+        )
+        self._purge_expired()
+
+    def _purge_expired(self):
+        # nieaktualne wpisy pamięci podręcznej (stare wersje w kluczach) nie są już odczytywane - bez tego plik rośnie
+        now = time.time()
+        if now - self._purged_at < self.purge_interval:
+            return
+        self._purged_at = now
+        self._connection().execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+
+    def incr(self, key):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at <= ?", (key, now))
+            conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, '1', NULL) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT)",
+                (key,),
+            )
+            value = int(conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()[0])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def expire(self, key, seconds):
+        self._connection().execute("UPDATE kv SET expires_at = ? WHERE key = ?", (time.time() + seconds, key))
+
+    def delete(self, *keys):
+        self._connection().executemany("DELETE FROM kv WHERE key = ?", [(key,) for key in keys])
+
+    def flushdb(self):
+        self._connection().execute("DELETE FROM kv")
+
+
+def connect(url: str):
+    if url == "fake":
+        return FakeRedis()
+    if url.startswith("sqlite:///"):
+        return SqliteRedis(url[len("sqlite:///"):])
+    import redis  # opcjonalna zależność, potrzebna tylko z prawdziwym serwerem
+    return redis.Redis.from_url(url)
+
+
+class Versions:
+    # liczniki wersji tabel (leaves, users) - podbijane przy zapisie, część kluczy pamięci podręcznej
+    def __init__(self, client=None, prefix: str = "urlopy:version:"):
+        self.client = client
+        self.prefix = prefix
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> int:
+        if self.client is not None:
+            return int(self.client.get(self.prefix + name) or 0)
+        return self._local.get(name, 0)
+
+    def bump(self, name: str):
+        if self.client is not None:
+            self.client.incr(self.prefix + name)
+            return
+        with self._lock:
+            self._local[name] = self._local.get(name, 0) + 1
+
+
+client = connect(config.STATE_REDIS_URL) if config.STATE_BACKEND == "redis" else None
+versions = Versions(client)
@@ -0,0 +1,14 @@
+# Testy na osobnej bazie SQLite w katalogu tymczasowym - ustawiane przed importem modułów aplikacji,
+# więc DATABASE_URL z otoczenia (lub .env) nigdy nie jest używany
+import os
+import sys
+import tempfile
+
+TEST_DB = os.path.join(tempfile.mkdtemp(prefix="urlopy_tests_"), "test.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + TEST_DB
+os.environ["DB_ASYNC"] = "false"
+os.environ["STATE_BACKEND"] = "memory"
+os.environ["EMAIL_BACKEND"] = "fake"  # utils.FakeSMTP zamiast serwera SMTP
+os.environ["OUTBOX_WORKER_ENABLED"] = "false"  # testy wołają outbox.drain same
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
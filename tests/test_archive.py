@@ -0,0 +1,41 @@
+# Archiwizacja roku (bez partycji - wiersze usuwane z leaves): salda lat, które zostają, nadal zgodne
+# z pełnym przeliczeniem
+from datetime import date
+
+import pytest
+
+import balances
+import partitions
+from database import Base, SessionLocal, engine
+from models import Leave, User
+
+TODAY = date(2026, 6, 1)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    session.add(User(id=1, email="anna@example.com", name="anna", password="x"))
+    session.add(Leave(user_id=1, date_from=date(2023, 12, 27), date_to=date(2024, 1, 5)))
+    session.add(Leave(user_id=1, date_from=date(2024, 3, 4), date_to=date(2024, 3, 8)))
+    session.commit()
+    balances.rebuild_balances(session)
+    yield session
+    session.close()
+
+
+def test_year_continuing_into_unarchived_year_is_refused(db):
+    with pytest.raises(ValueError, match="najpierw zarchiwizuj rok 2024"):
+        partitions.archive_year(db, 2023, export_path="urlopy_2023.csv", today=TODAY)
+    assert db.query(Leave).count() == 2
+    assert balances.check_balances(db) == []
+
+
+def test_year_continuing_into_archived_year(db):
+    partitions.archive_year(db, 2024, export_path="urlopy_2024.csv", today=TODAY)
+    rows, _ = partitions.archive_year(db, 2023, export_path="urlopy_2023.csv", today=TODAY)
+    assert rows == 1
+    assert db.query(Leave).count() == 0
+    assert balances.check_balances(db) == []
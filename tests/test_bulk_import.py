@@ -0,0 +1,33 @@
+# Masowy import: błędne wiersze trafiają do raportu z numerem linii, reszta pliku się importuje
+import io
+
+import pytest
+
+import balances
+import bulk
+from database import Base, SessionLocal, engine
+from models import Leave, User
+
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    session.add(User(id=1, email="anna@example.com", name="anna", password="x"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_non_string_user_fields_are_reported_per_line(db):
+    stream = io.StringIO(
+        '{"email": 5, "date_from": "2026-03-02", "date_to": "2026-03-03"}\n'
+        '{"name": ["anna"], "date_from": "2026-03-09", "date_to": "2026-03-10"}\n'
+        '{"email": "ANNA@example.com", "date_from": "2026-03-16", "date_to": "2026-03-20"}\n'
+    )
+    report = bulk.import_file(SessionLocal, stream, "jsonl")
+    assert report["imported"] == 1
+    assert [line_no for line_no, _ in report["errors"]] == [1, 2]
+    assert db.query(Leave).count() == 1
+    assert balances.check_balances(db) == []
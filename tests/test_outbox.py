@@ -0,0 +1,110 @@
+# Kolejka powiadomień z EMAIL_BACKEND=fake (conftest.py): partia przez jedno połączenie, ponowienia
+# z wydłużanym odstępem, porzucenie po OUTBOX_MAX_ATTEMPTS, brak wierszy dla odrzuconego urlopu
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import config
+import crud
+import outbox
+import overlaps
+import utils
+from database import Base, SessionLocal, engine
+from models import NotificationOutbox, User
+from schemas import LeaveCreate
+
+NOW = datetime(2026, 3, 2, 8, 0)
+
+
+class FixedDatetime(datetime):
+    now = classmethod(lambda cls: cls.current)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    session.add(User(id=1, email="anna@example.com", name="anna", password="x"))
+    for i in range(3):
+        session.add(User(id=10 + i, email=f"admin{i}@example.com", name=f"admin{i}", password="x", role="admin"))
+    session.commit()
+    FixedDatetime.current = NOW
+    monkeypatch.setattr(outbox, "datetime", FixedDatetime)
+    utils.FakeSMTP.sent.clear()
+    yield session
+    session.close()
+
+
+def add_leave(db, day: int):
+    leave = LeaveCreate(date_from=date(2026, 3, day), date_to=date(2026, 3, day + 1), comment=None)
+    return crud.create_leave(db, leave, user_id=1, notify_admins=True)
+
+
+def statuses(db):
+    db.expire_all()
+    return [item.status for item in db.query(NotificationOutbox).order_by(NotificationOutbox.id)]
+
+
+def test_drain_sends_batch_over_one_connection(db, monkeypatch):
+    connections = []
+
+    def counting_connection():
+        connections.append(utils.FakeSMTP())
+        return connections[-1]
+
+    monkeypatch.setattr(utils, "open_smtp_connection", counting_connection)
+    add_leave(db, 2)
+    add_leave(db, 9)
+    assert outbox.drain(db) == 6
+    assert len(connections) == 1
+    assert sorted(recipient for _, recipient, _ in utils.FakeSMTP.sent) == sorted(
+        f"admin{i}@example.com" for i in range(3) for _ in range(2)
+    )
+    assert statuses(db) == ["sent"] * 6
+    assert outbox.drain(db) == 0
+
+
+def fail_sending(monkeypatch):
+    def sendmail(self, sender, recipient, message):
+        raise OSError("serwer niedostępny")
+
+    monkeypatch.setattr(utils.FakeSMTP, "sendmail", sendmail)
+
+
+def test_failed_send_backs_off(db, monkeypatch):
+    fail_sending(monkeypatch)
+    add_leave(db, 2)
+    assert outbox.drain(db) == 3
+    item = db.query(NotificationOutbox).first()
+    assert (item.status, item.attempts, item.last_error) == ("pending", 1, "serwer niedostępny")
+    assert item.next_attempt_at == NOW + timedelta(seconds=config.OUTBOX_BACKOFF_SECONDS)
+
+    assert outbox.drain(db) == 0  # przed next_attempt_at nic nie jest ponawiane
+    FixedDatetime.current = item.next_attempt_at
+    assert outbox.drain(db) == 3
+    db.refresh(item)
+    assert item.attempts == 2
+    assert item.next_attempt_at == FixedDatetime.current + timedelta(seconds=2 * config.OUTBOX_BACKOFF_SECONDS)
+
+
+def test_rows_go_dead_after_max_attempts(db, monkeypatch):
+    fail_sending(monkeypatch)
+    add_leave(db, 2)
+    for attempt in range(config.OUTBOX_MAX_ATTEMPTS):
+        assert statuses(db) == ["pending"] * 3
+        FixedDatetime.current = NOW + timedelta(days=attempt)  # po każdym odstępie
+        assert outbox.drain(db) == 3
+    assert statuses(db) == ["dead"] * 3
+    FixedDatetime.current = NOW + timedelta(days=365)
+    assert outbox.drain(db) == 0
+    assert not utils.FakeSMTP.sent
+
+
+def test_rejected_leave_leaves_no_outbox_rows(db):
+    add_leave(db, 2)
+    assert len(statuses(db)) == 3
+    with pytest.raises(overlaps.LeaveConflictError):  # API odpowiada 409
+        add_leave(db, 3)
+    db.rollback()
+    assert len(statuses(db)) == 3
@@ -0,0 +1,126 @@
+# Wykrywanie nakładania się urlopów (drzewo przedziałów, zamiatanie, walidacja) porównane z przeglądem
+# wszystkich urlopów dzień po dniu - losowe dane, wiele zakresów; drzewo w pamięci aktualizowane przy zapisach
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import crud
+import overlaps
+from database import Base, SessionLocal, engine
+from models import Leave, User
+from schemas import LeaveCreate
+
+FIRST_DAY = date(2025, 1, 1)
+
+
+def random_period(rnd, max_length: int = 20):
+    start = FIRST_DAY + timedelta(days=rnd.randint(0, 400))
+    return start, start + timedelta(days=rnd.randint(0, max_length))
+
+
+def brute_overlapping(items, start: date, end: date):
+    return sorted(payload for first, last, payload in items if first <= end and last >= start)
+
+
+def brute_max_concurrent(rows, start: date, end: date):
+    best, best_day = 0, None
+    day = start
+    while day <= end:
+        count = sum(1 for row in rows if row[2] <= day <= row[3])
+        if count > best:
+            best, best_day = count, day
+        day += timedelta(days=1)
+    return best, best_day
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_interval_tree_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    items = [(*random_period(rnd, rnd.choice([0, 3, 30, 200])), i) for i in range(rnd.randint(0, 300))]
+    tree = overlaps.IntervalTree(items)
+    assert len(tree) == len(items)
+    for _ in range(200):
+        start, end = random_period(rnd, rnd.choice([0, 7, 60]))
+        assert sorted(tree.overlapping(start, end)) == brute_overlapping(items, start, end)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_max_concurrent_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    rows = [(i, i % 7, *random_period(rnd), f"user{i % 7}") for i in range(rnd.randint(0, 60))]
+    for _ in range(50):
+        start, end = random_period(rnd, 45)
+        assert overlaps.max_concurrent(rows, start, end) == brute_max_concurrent(rows, start, end)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    session.add_all(User(id=i, email=f"user{i}@example.com", name=f"user{i}", password="x") for i in range(1, 9))
+    session.commit()
+    index = overlaps.LeaveIntervalIndex(ttl=3600)
+    monkeypatch.setattr(overlaps, "leave_index", index)
+    yield session
+    session.close()
+
+
+def stored_leaves(db):
+    return [(leave.id, leave.user_id, leave.date_from, leave.date_to) for leave in db.query(Leave)]
+
+
+def test_validate_leave_matches_brute_force(db):
+    rnd = random.Random(1)
+    for _ in range(300):
+        user_id = rnd.randint(1, 8)
+        date_from, date_to = random_period(rnd)
+        clashes = [row for row in stored_leaves(db) if row[1] == user_id and row[2] <= date_to and row[3] >= date_from]
+        try:
+            crud.create_leave(db, LeaveCreate(date_from=date_from, date_to=date_to), user_id=user_id)
+        except overlaps.LeaveConflictError as e:
+            db.rollback()
+            assert sorted(c.id for c in e.conflicts) == sorted(row[0] for row in clashes)
+        else:
+            assert clashes == []
+    with pytest.raises(overlaps.LeaveConflictError):
+        overlaps.validate_leave(db, 1, date(2025, 3, 2), date(2025, 3, 1))
+
+
+def test_who_is_off_follows_writes_without_reloading(db, monkeypatch):
+    rnd = random.Random(2)
+    for user_id in range(1, 9):
+        day = FIRST_DAY + timedelta(days=rnd.randint(0, 10))
+        while day < FIRST_DAY + timedelta(days=400):
+            length = rnd.randint(0, 12)
+            db.add(Leave(user_id=user_id, date_from=day, date_to=day + timedelta(days=length)))
+            day += timedelta(days=length + 1 + rnd.randint(0, 30))
+    db.commit()
+
+    loads = []
+    load = overlaps.leave_index._load
+    monkeypatch.setattr(overlaps.leave_index, "_load", lambda db: loads.append(1) or load(db))
+
+    for step in range(400):
+        leave = rnd.choice(db.query(Leave).all())
+        action = rnd.random()
+        try:
+            if action < 0.3:
+                crud.delete_leave(db, leave)
+            elif action < 0.6:
+                date_from, date_to = random_period(rnd)
+                crud.update_leave(db, leave, date_from, date_to, leave.comment)
+            else:
+                date_from, date_to = random_period(rnd)
+                crud.create_leave(db, LeaveCreate(date_from=date_from, date_to=date_to), user_id=rnd.randint(1, 8))
+        except overlaps.LeaveConflictError:
+            db.rollback()
+        start, end = random_period(rnd, 30)
+        expected = sorted(
+            (leave_id, user_id, date_from, date_to, f"user{user_id}")
+            for leave_id, user_id, date_from, date_to in stored_leaves(db)
+            if date_from <= end and date_to >= start
+        )
+        assert sorted(overlaps.who_is_off(db, start, end)) == expected
+    assert len(loads) == 1
@@ -0,0 +1,98 @@
+# Podsumowanie roku na dashboardzie: wszystkie tryby liczenia (SQL, sumy prefiksowe, leave_balances)
+# muszą dać to samo co pierwotna pętla dzień po dniu - dla wielu lat, dni "dziś" i obu wartości HOLIDAYS_PERSIST
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import balances
+import config
+import crud
+import workdays
+from database import Base, SessionLocal, engine
+from models import Leave, User
+
+YEARS = [2019, 2020, 2024, 2025, 2026]
+
+
+def loop_summary(leaves, year: int, today: date):
+    # pierwotna pętla z widoku dashboardu: dzień po dniu, pn-pt bez świąt
+    holidays = workdays.get_holidays(year)
+    summary = {}
+    for user_id, date_from, date_to in leaves:
+        past, future = summary.get(user_id, (0, 0))
+        current = max(date_from, date(year, 1, 1))
+        end = min(date_to, date(year, 12, 31))
+        while current <= end:
+            if current.weekday() < 5 and current not in holidays:
+                if current <= today:
+                    past += 1
+                else:
+                    future += 1
+            current += timedelta(days=1)
+        summary[user_id] = (past, future)
+    return summary
+
+
+def nonzero(summary):
+    return {user_id: days for user_id, days in summary.items() if days != (0, 0)}
+
+
+def todays(year: int):
+    return [
+        date(year - 1, 12, 31),
+        date(year, 1, 1),
+        date(year, 5, 1),  # święto
+        date(year, 6, 15),
+        date(year, 12, 24),
+        date(year, 12, 31),
+        date(year + 1, 2, 1),
+    ]
+
+
+@pytest.fixture(scope="module")
+def leaves():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(0)
+    rows = []
+    db = SessionLocal()
+    db.add_all(User(id=i, email=f"user{i}@example.com", name=f"user{i}", password="x") for i in range(1, 21))
+    for user_id in range(1, 21):
+        # urlopy jednej osoby się nie nakładają; część przechodzi przez Nowy Rok
+        day = date(2018, 11, 1) + timedelta(days=rnd.randint(0, 30))
+        while day < date(2027, 3, 1):
+            length = rnd.choice([0, 1, 4, 9, 13, 20])
+            rows.append((user_id, day, day + timedelta(days=length)))
+            day += timedelta(days=length + 1 + rnd.randint(0, 60))
+    rows.append((1, date(2019, 12, 20), date(2020, 1, 10)))  # przez święta i Nowy Rok
+    rows = sorted(set(rows))
+    db.add_all(Leave(user_id=u, date_from=f, date_to=t) for u, f, t in rows)
+    db.commit()
+    balances.rebuild_balances(db)
+    db.close()
+    return rows
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.mark.parametrize("persist", [False, True])
+@pytest.mark.parametrize("year", YEARS)
+def test_all_modes_match_loop(leaves, db, monkeypatch, year, persist):
+    monkeypatch.setattr(config, "HOLIDAYS_PERSIST", persist)
+    calendar = workdays.get_calendar(year)
+    rows = crud.get_year_leave_rows(db, year)
+    for today in todays(year):
+        expected = loop_summary(leaves, year, today)
+        assert nonzero(crud.get_year_summary_sql(db, year, today)) == nonzero(expected), today
+        assert nonzero(workdays.summarize_by_user(calendar, rows, today)) == nonzero(expected), today
+        assert nonzero(balances.get_year_totals(db, year, today)) == nonzero(expected), today
+
+
+def test_balances_match_full_rebuild(leaves, db):
+    assert balances.check_balances(db) == []
@@ -0,0 +1,64 @@
+# Pamięć podręczna użytkowników w procesie (id -> dane bez hasła), z TTL i unieważnianiem przy zmianach
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from sqlalchemy.orm import Session
+from models import User
+import config
+
+
+class CachedUser(NamedTuple):
+    id: int
+    email: str
+    name: str
+    role: str
+
+
+class UserCache:
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._items = OrderedDict()  # id -> (wygasa_o, CachedUser), kolejność LRU
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int):
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is None:
+                return None
+            expires_at, user = item
+            if expires_at < time.monotonic():
+                del self._items[user_id]
+                return None
+            self._items.move_to_end(user_id)
+            return user
+
+    def put(self, user: CachedUser):
+        with self._lock:
+            self._items[user.id] = (time.monotonic() + self.ttl_seconds, user)
+            self._items.move_to_end(user.id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._items.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def load(self, db: Session, user_id: int):
+        # z cache albo z bazy (jedno zapytanie o potrzebne kolumny); None, gdy użytkownik nie istnieje
+        user = self.get(user_id)
+        if user is None:
+            row = db.query(User.id, User.email, User.name, User.role).filter_by(id=user_id).first()
+            if row is None:
+                return None
+            user = CachedUser(*row)
+            self.put(user)
+        return user
+
+
+users = UserCache(config.USER_CACHE_TTL_SECONDS, config.USER_CACHE_SIZE)
@@ -1,4 +1,5 @@
 import smtplib
+from collections import deque
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
@@ -10,8 +11,52 @@ EMAIL_SENDER = os.getenv("EMAIL_SENDER")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "smtp")  # "smtp" albo "fake" (lokalnie/testy - nic nie wysyła)
 
-def send_leave_notification(admin_emails, employee_name, date_from, date_to, comment):
+
+class FakeSMTP:
+    # zastępuje smtplib.SMTP_SSL - zapamiętuje ostatnie wiadomości zamiast je wysyłać (serwer deweloperski
+    # z EMAIL_BACKEND=fake działa długo, więc lista ma stały rozmiar)
+    sent = deque(maxlen=1000)
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return 250, b"OK"
+
+    def sendmail(self, sender, recipient, message):
+        FakeSMTP.sent.append((sender, recipient, message))
+
+    def quit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.quit()
+
+
+def open_smtp_connection():
+    # jedno zalogowane połączenie, używane do wysyłki wielu wiadomości
+    if EMAIL_BACKEND == "fake":
+        return FakeSMTP()
+    server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT)
+    server.login(EMAIL_SENDER, EMAIL_PASSWORD)
+    return server
+
+
+def build_message(recipient, subject, body) -> str:
+    msg = MIMEMultipart()
+    msg["From"] = EMAIL_SENDER
+    msg["To"] = recipient
+    msg["Subject"] = subject
+    msg.attach(MIMEText(body, "plain"))
+    return msg.as_string()
+
+
+def build_leave_notification(employee_name, date_from, date_to, comment):
     subject = f"Nowy urlop: {employee_name}"
     body = f"""
 Użytkownik {employee_name} zgłosił nowy urlop:
@@ -20,17 +65,5 @@ Od: {date_from}
 Do: {date_to}
 Komentarz: {comment or '-'}
 """
+    return subject, body
 
-    for recipient in admin_emails:
-        try:
-            msg = MIMEMultipart()
-            msg["From"] = EMAIL_SENDER
-            msg["To"] = recipient
-            msg["Subject"] = subject
-            msg.attach(MIMEText(body, "plain"))
-
-            with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT) as server:
-                server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-                server.sendmail(EMAIL_SENDER, recipient, msg.as_string())
-        except Exception as e:
-            print(f"Błąd wysyłania e-maila do {recipient}: {e}")
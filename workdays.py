@@ -0,0 +1,132 @@
+# Silnik dni roboczych - prekalkulowany kalendarz dni roboczych (pn-pt bez świąt) dla danego roku
+from datetime import date
+from functools import lru_cache
+import numpy as np
+from holidays import Poland
+from sqlalchemy.dialects import postgresql, sqlite
+import config
+from models import Holiday
+
+
+class WorkingDayCalendar:
+    def __init__(self, year: int, holidays=None):
+        if holidays is None:
+            holidays = get_holidays(year)
+        self.year = year
+        self.first_day = date(year, 1, 1)
+        self.last_day = date(year, 12, 31)
+
+        days = np.arange(np.datetime64(self.first_day, "D"), np.datetime64(date(year + 1, 1, 1), "D"))
+        holiday_days = np.array(sorted(holidays), dtype="datetime64[D]")
+        working = np.is_busday(days, holidays=holiday_days)  # domyślnie pn-pt
+
+        self.bitmap = np.packbits(working)  # 1 bit na dzień roku (46 bajtów)
+        # prefix[i] = liczba dni roboczych przed i-tym dniem roku, więc zakres liczymy w O(1)
+        self.prefix = np.concatenate(([0], np.cumsum(working, dtype=np.int64)))
+        self._prefix_list = self.prefix.tolist()  # szybszy dostęp do pojedynczych elementów
+
+    def is_working_day(self, day: date) -> bool:
+        i = (day - self.first_day).days
+        return bool((self.bitmap[i >> 3] >> (7 - (i & 7))) & 1)
+
+    def count(self, start: date, end: date) -> int:
+        # liczba dni roboczych w zakresie [start, end], przyciętym do roku kalendarza
+        start = max(start, self.first_day)
+        end = min(end, self.last_day)
+        if start > end:
+            return 0
+        i = (start - self.first_day).days
+        j = (end - self.first_day).days + 1
+        return self._prefix_list[j] - self._prefix_list[i]
+
+    def _offsets(self, dates):
+        # daty -> indeksy dni w roku (mogą wychodzić poza rok, przycinamy później); numery dni (toordinal)
+        # zamiast konwersji obiektów date na datetime64 - wielokrotnie szybciej, jak w occupancy.build_year
+        first = self.first_day.toordinal()
+        return np.fromiter((day.toordinal() for day in dates), dtype=np.int64, count=len(dates)) - first
+
+    def split_counts(self, starts, ends, today: date):
+        # wektorowo: dla każdego zakresu [start, end] dni robocze do "today" włącznie i po nim
+        last = len(self.prefix) - 2
+        s = np.clip(self._offsets(starts), 0, last + 1)
+        e = np.clip(self._offsets(ends), -1, last)
+        t = min(max((today - self.first_day).days, -1), last)
+
+        past_end = np.minimum(e, t)
+        past = np.where(s <= past_end, self.prefix[np.clip(past_end + 1, 0, last + 1)] - self.prefix[s], 0)
+
+        future_start = np.maximum(s, t + 1)
+        future = np.where(future_start <= e, self.prefix[np.clip(e + 1, 0, last + 1)] - self.prefix[np.clip(future_start, 0, last + 1)], 0)
+        return past, future
+
+
+@lru_cache(maxsize=config.HOLIDAY_CACHE_YEARS)
+def get_holidays(year: int) -> frozenset:
+    # święta ustawowe w Polsce dla danego roku - liczone raz, potem z cache (LRU)
+    return frozenset(Poland(years=year).keys())
+
+
+@lru_cache(maxsize=config.HOLIDAY_CACHE_YEARS)
+def get_calendar(year: int) -> WorkingDayCalendar:
+    return WorkingDayCalendar(year, get_holidays(year))
+
+
+def warm(years):
+    # wstępne wyliczenie świąt i kalendarzy, np. przy starcie aplikacji
+    for year in years:
+        get_calendar(year)
+
+
+def is_working_day(day: date) -> bool:
+    return get_calendar(day.year).is_working_day(day)
+
+
+def working_days_between(start: date, end: date) -> int:
+    # liczba dni roboczych w zakresie [start, end], również przez kilka lat
+    return sum(get_calendar(year).count(start, end) for year in range(start.year, end.year + 1))
+
+
+_synced_years = set()  # lata, których święta ten proces już zapisał w tabeli holidays
+
+
+def sync_holidays_table(db, years):
+    # zapisuje święta do tabeli holidays, żeby zapytania SQL mogły się z nią łączyć;
+    # INSERT ... ON CONFLICT DO NOTHING - bezpieczne przy kilku procesach naraz
+    years = sorted(set(years))
+    rows = []
+    for year in years:
+        names = Poland(years=year)
+        rows.extend({"day": day, "name": names[day]} for day in sorted(get_holidays(year)))
+    if rows:
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        db.execute(dialect.insert(Holiday).on_conflict_do_nothing(index_elements=[Holiday.day]), rows)
+    db.commit()
+    _synced_years.update(years)
+
+
+def ensure_holidays_table(db, year: int):
+    # święta roku w tabeli przed zapytaniem, które się z nią łączy - każdy rok, nie tylko rozgrzewane przy init
+    if year not in _synced_years:
+        sync_holidays_table(db, [year])
+
+
+def summarize_by_user(calendar: WorkingDayCalendar, rows, today: date):
+    # rows: iterowalne (user_id, date_from, date_to); wynik: {user_id: (dni_przeszłe, dni_przyszłe)}
+    user_ids, starts, ends = [], [], []
+    for user_id, date_from, date_to in rows:
+        user_ids.append(user_id)
+        starts.append(date_from)
+        ends.append(date_to)
+
+    if not user_ids:
+        return {}
+
+    unique_ids, user_index = np.unique(np.asarray(user_ids), return_inverse=True)
+    past, future = calendar.split_counts(starts, ends, today)
+    past_sums = np.bincount(user_index, weights=past, minlength=len(unique_ids))
+    future_sums = np.bincount(user_index, weights=future, minlength=len(unique_ids))
+
+    return {
+        int(user_id): (int(p), int(f))
+        for user_id, p, f in zip(unique_ids.tolist(), past_sums.tolist(), future_sums.tolist())
+    }